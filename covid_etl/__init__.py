@@ -0,0 +1,5 @@
+"""
+ETL pipelines loading ECDC COVID-19 notification rates, countries of the world and OWID vaccination data into PostgreSQL.
+
+Heavy dependencies (pandas, numpy, requests, psycopg2 and SQLAlchemy) are imported by the pipeline modules only, so importing this package and running the cheap CLI commands stays fast.
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from covid_etl.cli import main
+
+sys.exit(main())
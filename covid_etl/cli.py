@@ -0,0 +1,229 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+from covid_etl import config
+
+def positive_int(value: str) -> int:
+    """
+    Parses a command line value that must be a positive integer.
+
+    Args:
+        - value: string given on the command line.
+
+    Returns:
+        int: the parsed value.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid positive int value: {value!r}") from None
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive int value: {value!r}")
+
+    return number
+
+
+# Pipelines run by the CLI. Their modules import pandas, numpy, requests and SQLAlchemy at load,
+# so they are only imported once a subcommand actually runs. {ecdc_source} in a plan step is
+# replaced by the ECDC source the run would download.
+PIPELINES = {
+    "init-load": {
+        "module": "covid_etl.init_load",
+        "help": "create the database and make the first load of the ECDC and countries of the world datasets",
+        "plan": [
+            f"drop and create database {config.DATABASE_NAME}",
+            f"drop and create schemas {config.COVID_SCHEMA_NAME} and {config.COUNTRY_SCHEMA_NAME}",
+            "extract {ecdc_source}",
+            f"extract {config.COUNTRIES_CSV_PATH}",
+            f"create and load {config.COVID_SCHEMA_NAME}.{config.COVID_TABLE_NAME}",
+            f"create and load {config.COUNTRY_SCHEMA_NAME}.{config.COUNTRY_TABLE_NAME}",
+        ],
+    },
+    "incremental": {
+        "module": "covid_etl.incremental",
+        "help": "upsert the rows of the ECDC dataset that changed since the last run",
+        "plan": [
+            "extract {ecdc_source}",
+            f"read yesterday's rows of {config.COVID_SCHEMA_NAME}.{config.COVID_TABLE_NAME}",
+            f"upsert new and changed rows into {config.COVID_SCHEMA_NAME}.{config.COVID_TABLE_NAME}",
+            f"refresh {config.COVID_SCHEMA_NAME}.{config.WEEKLY_FACT_TABLE_NAME} for the countries that changed",
+        ],
+        "arguments": {
+            "upsert_workers": ("--upsert-workers", {
+                "type": positive_int,
+                "help": "number of connections upserting shards of the changed rows concurrently (default: 1, or COVID_ETL_UPSERT_WORKERS)",
+            }),
+        },
+    },
+    "load-vaccinations": {
+        "module": "covid_etl.vaccinations",
+        "help": "load the OWID vaccination dataset",
+        "plan": [
+            f"extract {config.VACCINATION_CSV_PATH}",
+            f"drop, create and load {config.COVID_SCHEMA_NAME}.{config.VACCINATION_TABLE_NAME}",
+            f"refresh {config.COVID_SCHEMA_NAME}.{config.WEEKLY_FACT_TABLE_NAME} for every country",
+        ],
+    },
+    "refresh-weekly-fact": {
+        "module": "covid_etl.weekly_fact",
+        "help": "build or refresh the weekly table joining ECDC cases and deaths with OWID vaccination coverage and GDP per capita",
+        "plan": [
+            f"read {config.COVID_SCHEMA_NAME}.{config.COVID_TABLE_NAME} and {config.COVID_SCHEMA_NAME}.{config.VACCINATION_TABLE_NAME}",
+            "align the daily OWID rows to the ECDC ISO weeks with an as-of join by country",
+            f"upsert new and changed rows into {config.COVID_SCHEMA_NAME}.{config.WEEKLY_FACT_TABLE_NAME}",
+        ],
+    },
+}
+
+# Tables reported by the status command, and whether they carry the updated_at column.
+STATUS_TABLES = [
+    (config.COVID_SCHEMA_NAME, config.COVID_TABLE_NAME, True),
+    (config.COUNTRY_SCHEMA_NAME, config.COUNTRY_TABLE_NAME, True),
+    (config.COVID_SCHEMA_NAME, config.VACCINATION_TABLE_NAME, False),
+    (config.COVID_SCHEMA_NAME, config.WEEKLY_FACT_TABLE_NAME, True),
+]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser of the covid-etl command.
+
+    Returns:
+        parser: argparse.ArgumentParser with one subcommand per pipeline plus the status command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="covid-etl", description="Loads COVID-19 cases, deaths, country and vaccination data into PostgreSQL.")
+    parser.add_argument("--timings", action="store_true",
+                        help="report how long importing the pipeline dependencies and running the command took")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name, pipeline in PIPELINES.items():
+        subparser = subparsers.add_parser(name, help=pipeline["help"], description=pipeline["help"])
+        subparser.add_argument("--dry-run", action="store_true",
+                               help="print the steps of the pipeline without importing its dependencies or touching the database")
+        subparser.add_argument("--memory-budget-mb", type=float, default=None,
+                               help="memory budget in megabytes; stages going over it are chunked and spilled to disk")
+        for flag, options in pipeline.get("arguments", {}).values():
+            subparser.add_argument(flag, default=None, **options)
+
+    subparsers.add_parser("status", help="report row counts and last update of the loaded tables",
+                          description="report row counts and last update of the loaded tables")
+
+    return parser
+
+
+def run_pipeline(name: str, args: argparse.Namespace) -> int:
+    """
+    Imports the module of a pipeline and executes it.
+
+    Args:
+        - name: name of the subcommand running the pipeline.
+        - args: parsed command line arguments.
+
+    Returns:
+        int: exit code of the command.
+    """
+    pipeline = PIPELINES[name]
+
+    if args.dry_run:
+        print(f"{name} would:")
+        for step in pipeline["plan"]:
+            print(f"  - {step.format(ecdc_source=ecdc_source(args))}")
+        return 0
+
+    start = time.perf_counter()
+    module = importlib.import_module(pipeline["module"])
+    if args.timings:
+        print(f"Imported {pipeline['module']} in {time.perf_counter() - start:.2f} s")
+
+    if args.memory_budget_mb is not None:
+        from covid_etl import memory_budget
+        memory_budget.set_memory_budget(args.memory_budget_mb)
+
+    # Options the user did not set are left to the pipeline's own defaults.
+    main_kwargs = {dest: getattr(args, dest) for dest in pipeline.get("arguments", {})
+                   if getattr(args, dest) is not None}
+    module.main(**main_kwargs)
+
+    return 0
+
+
+def ecdc_source(args: argparse.Namespace) -> str:
+    """
+    Returns the ECDC source a pipeline downloads: the CSV version is streamed to disk when a memory budget is set, the JSON one is read in memory otherwise.
+
+    Args:
+        - args: parsed command line arguments.
+    """
+    # Read here rather than from covid_etl.memory_budget, which imports pandas and numpy.
+    budget_set = args.memory_budget_mb is not None or os.environ.get("COVID_ETL_MEMORY_BUDGET_MB") not in (None, "")
+
+    return config.ECDC_CSV_URL if budget_set else config.ECDC_URL
+
+
+def run_status() -> int:
+    """
+    Prints the row count and latest update date of every table loaded by the pipelines.
+
+    Returns:
+        int: exit code of the command.
+    """
+    import psycopg2
+
+    from covid_etl.db import connect_to_postgres
+
+    try:
+        conn = connect_to_postgres(database=config.DATABASE_NAME)
+    except psycopg2.Error as error:
+        print(f"Could not connect to database '{config.DATABASE_NAME}': {error}".strip())
+        return 1
+
+    try:
+        cursor = conn.cursor()
+        for schema_name, table_name, has_updated_at in STATUS_TABLES:
+            columns = "COUNT(*), MAX(updated_at)" if has_updated_at else "COUNT(*), NULL"
+            try:
+                cursor.execute(f"SELECT {columns} FROM {schema_name}.{table_name};")
+                row_count, updated_at = cursor.fetchone()
+            except psycopg2.Error as error:
+                print(f"{schema_name}.{table_name}: not available ({str(error).strip()})")
+                continue
+
+            last_update = f", last updated at {updated_at}" if updated_at else ""
+            print(f"{schema_name}.{table_name}: {row_count} rows{last_update}")
+    finally:
+        conn.close()
+
+    return 0
+
+
+def main(argv=None) -> int:
+    """
+    Entry point of the covid-etl command.
+
+    Args:
+        - argv: optional list of command line arguments. Standard value is None, in which case sys.argv is used.
+
+    Returns:
+        int: exit code of the command.
+    """
+    start = time.perf_counter()
+    args = build_parser().parse_args(argv)
+
+    if args.command == "status":
+        exit_code = run_status()
+    else:
+        exit_code = run_pipeline(args.command, args)
+
+    if args.timings:
+        print(f"{args.command} finished in {time.perf_counter() - start:.2f} s")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+DATABASE_NAME = "covid_db"
+DB_PARAMS = {
+    "host": "localhost",
+    "user": "username",
+    "password": "yourpass"
+}
+
+COVID_SCHEMA_NAME = "covid_data"
+COUNTRY_SCHEMA_NAME = "country_data"
+
+COVID_TABLE_NAME = "national_14day_notification_rate_covid_19"
+COUNTRY_TABLE_NAME = "countries_of_the_world"
+VACCINATION_TABLE_NAME = "covid_vaccination_data"
+WEEKLY_FACT_TABLE_NAME = "weekly_covid_vaccination_fact"
+
+ECDC_URL = "https://opendata.ecdc.europa.eu/covid19/nationalcasedeath/json/"
+# Same dataset as CSV, which can be streamed to disk and read back in chunks.
+ECDC_CSV_URL = "https://opendata.ecdc.europa.eu/covid19/nationalcasedeath/csv/"
+COUNTRIES_CSV_PATH = "countries_of_the_world.csv"
+VACCINATION_CSV_PATH = "owid-covid-data.csv"
@@ -0,0 +1,160 @@
+import psycopg2
+
+from covid_etl.config import DATABASE_NAME, DB_PARAMS
+
+
+def create_sql_script(df, table_name: str, schema_name: str, primary_key_cols=None, nullable_columns=None, column_types=None) -> str:
+    """
+    This function creates the script that will be used to create the tables in the database prior to the first load, based on its column types. A primary key for each table can also be defined in this script. 
+
+    Args: 
+        - df: pd.DataFrame to be inserted into table.
+        - table_name: name that the table will have in the PostgreSQL database.
+        - schema_name: name of the schema where the table will be set.
+        - primary_key_cols: list of column names to be used as table primary key. Can be a list containing a single value.Will be None in case a primary key is not to be set. 
+        - nullable_columns: optional collection of column names to be declared NULL regardless of the values in df, e.g. when df only holds part of the dataset.
+        - column_types: optional dict of column names to SQL types, used instead of the types inferred from df, e.g. when df is an empty frame that only holds the column dtypes.
+
+    Returns:
+       sql_script: the string containing the sql script with column names and types to create new tables. 
+    """
+
+    from pandas.api.types import infer_dtype
+
+    data_types = {
+        "int64": "INTEGER",
+        "float64": "NUMERIC",
+        "object": "TEXT",
+        "datetime64[ns]": "TIMESTAMP",
+        "bool": "BOOLEAN"
+    }
+
+    # Initializes the SQL script with the CREATE TABLE command
+    sql_script = f"CREATE TABLE IF NOT EXISTS {schema_name}.{table_name} (\n"
+
+    # Loops through the DataFrame columns
+    for column in df.columns:
+        # Use TEXT as the default type
+        data_type = data_types.get(str(df[column].dtype), "TEXT")
+        # datetime.date values, such as updated_at, are kept in object columns.
+        if data_type == "TEXT" and infer_dtype(df[column], skipna=True) == "date":
+            data_type = "DATE"
+        data_type = (column_types or {}).get(column, data_type)
+        nullability = "NOT NULL" if df[column].notnull().all() and column not in (nullable_columns or ()) else "NULL"
+        sql_script += f"    {column} {data_type} {nullability},\n"
+
+    # Adds the primary key declaration if columns are specified
+    if primary_key_cols:
+        primary_key = ", ".join(primary_key_cols)
+        sql_script += f"    PRIMARY KEY ({primary_key}),\n"
+
+    # Removes the extra comma at the end and close the CREATE TABLE command
+    sql_script = sql_script[:-2] + "\n);"
+
+    return sql_script
+
+
+def connect_to_postgres(database=None) -> psycopg2.connect:
+    """
+    This function creates a connection to local PostgreSQL database.
+
+    Args: 
+        - database: string containaing the name of the database to be connected with. Standard value is None in case the connection is not to be made to an specific database, e.g. when creating a new database.
+
+    Returns:
+       conn: psycopg2.connection object that contains connection to database.
+    """
+    if database:
+        conn = psycopg2.connect(database=database, **DB_PARAMS)
+    else:
+        conn = psycopg2.connect(**DB_PARAMS)
+    conn.autocommit = True
+    return conn
+
+
+def execute_create_sql_command(object_name: str, object_type: str, schema_name=None, create_table_sql=None) -> None:
+    """
+    This function creates the sql command that will be used to create either a database, schema or table within our PostgreSQL database. It utilizes our connection to PostgreSQL to create the desired object. 
+
+    Args:
+        - object_name: string containing the name o the object to be created.
+        - object_type: string containing the type of the object to be created. Accepted values are 'database', 'schema' and 'table'.
+        - schema_name: optional value. String containing name of the schema where a table is created.
+        - create_table_sql: optional value. String containing the SQL script with the CREATE TABLE command for a given table.     
+    """
+    conn = None
+
+    try:
+        if object_type == 'database':
+            conn = connect_to_postgres()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP {object_type} IF EXISTS {object_name};")
+            # Execute the SQL command to create the object
+            cursor.execute(f"CREATE {object_type} {object_name};")
+            print(f"{object_type} '{object_name}' created successfully!")
+
+        elif object_type == 'schema':
+            conn = connect_to_postgres(database=DATABASE_NAME)
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DROP {object_type} IF EXISTS {object_name} CASCADE;")
+            cursor.execute(
+                f"CREATE {object_type} IF NOT EXISTS {object_name};")
+            print(f"{object_type} '{object_name}' created successfully!")
+
+        elif object_type == 'table':
+            conn = connect_to_postgres(database=DATABASE_NAME)
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DROP {object_type} IF EXISTS {schema_name}.{object_name};")
+            cursor.execute(create_table_sql)
+            print(
+                f"{object_type} '{schema_name}.{object_name}' created successfully!")
+
+    except (Exception, psycopg2.Error) as error:
+        raise error
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def insert_dataframe_to_postgres(df, table_name: str, schema_name: str, if_exists='replace', chunksize=None) -> None:
+    """
+    Inserts the treated dataframe into the tables created in PostgreSQL database.
+
+    Args: 
+        - df: pd.DataFrame to be inserted.
+        - table_name: name of the table in PostgreSQL database
+        - schema_name: name of schema containing table in PostgreSQL database
+        - if_exists: specifies the behavior if the table already exists. The initial loads make one batch ingestion with all existing data on the data sources given, so we choose to replace. Avoid this method for incremental loads. 
+        - chunksize: optional number of rows written at a time. Standard value is None, in which case all rows are written at once.
+    """
+    # SQLAlchemy is only needed by the loads writing whole dataframes.
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import SQLAlchemyError
+
+    engine = create_engine(
+        f'postgresql://{DB_PARAMS["user"]}:{DB_PARAMS["password"]}@{DB_PARAMS["host"]}/{DATABASE_NAME}')
+
+    try:
+        df.to_sql(table_name, schema=schema_name, con=engine,
+                  if_exists=if_exists, index=False, chunksize=chunksize)
+    except SQLAlchemyError as e:
+        raise e
+
+
+def create_connection_pool(size: int, database=DATABASE_NAME):
+    """
+    Creates a pool of connections to local PostgreSQL database that can be shared between threads.
+
+    Args:
+        - size: maximum number of connections kept by the pool.
+        - database: string containing the name of the database to be connected with.
+
+    Returns:
+        pool: psycopg2.pool.ThreadedConnectionPool object. Its connections do not use autocommit, so each user commits its own transaction.
+    """
+    from psycopg2.pool import ThreadedConnectionPool
+
+    return ThreadedConnectionPool(1, size, database=database, **DB_PARAMS)
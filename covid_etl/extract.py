@@ -0,0 +1,144 @@
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+from covid_etl import memory_budget
+from covid_etl.config import ECDC_CSV_URL, ECDC_URL
+
+# Size of the blocks written to disk while streaming a download.
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Rows read to estimate the in-memory size of a downloaded dataset.
+SAMPLE_ROWS = 1000
+
+
+def get_national_14day_covid_data() -> pd.DataFrame:
+    """
+    This function retrieves the JSON data from the provided datasource.
+
+    Returns:
+        df_covid: pd.DataFrame with data on 14-day notification rate of new COVID-19 cases and deaths.
+    """
+    try:
+        response = requests.get(ECDC_URL)
+        data = response.json()
+        df_covid = pd.DataFrame(data)
+
+    except:
+        raise
+
+    return df_covid
+
+
+def download_to_file(url: str, path: str) -> None:
+    """
+    Streams a download to disk, so that the payload is never held in memory as a whole.
+
+    Args:
+        - url: address of the file to be downloaded.
+        - path: local path the file is written to.
+    """
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        with open(path, "wb") as file:
+            for block in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                file.write(block)
+
+
+def spill_national_14day_covid_data(store: memory_budget.SpillStore, transform=None, key_cols=None) -> int:
+    """
+    Streams the CSV version of the datasource to disk and spills it into a store in chunks sized by the memory budget. Used instead of get_national_14day_covid_data when a memory budget is set.
+
+    Args:
+        - store: SpillStore receiving the chunks. The raw download is kept in its directory while it is read.
+        - transform: optional function applied to every chunk before it is spilled.
+        - key_cols: optional list of columns to hash partition the rows on.
+
+    Returns:
+        chunk_rows: number of rows per chunk, to be reused by the following stages.
+    """
+    csv_path = store.path("ecdc_national_14day.csv")
+    download_to_file(ECDC_CSV_URL, csv_path)
+
+    sample_df = pd.read_csv(csv_path, nrows=SAMPLE_ROWS)
+    chunk_rows = memory_budget.rows_per_chunk(memory_budget.dataframe_bytes(sample_df) / max(len(sample_df), 1))
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if transform:
+            chunk = transform(chunk)
+        store.write(chunk, key_cols=key_cols)
+
+    os.remove(csv_path)
+
+    return chunk_rows
+
+
+def correct_column_name(name: str) -> str:
+    """
+    This function standardize column names for dataframes, removing spaces and special characters and converting every upper to lower case. 
+
+    Args: 
+        - name: string with the name of the column to be treated.
+
+    Returns:
+        str: string with corrected column name.
+    """
+    name = re.sub(r'[^\w\s]', '', name)
+    name = name.lower().strip()
+    name = name.replace(" ", "_")
+
+    return name
+
+
+def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function corects column names through iterating a loop on every column, calling the standardize_column_name function. 
+
+    Args: 
+        - df: pd.Dataframe with the dataframe to be treated.
+
+    Returns:
+        pd.DataFrame: Pandas DataFrame with corrected column names.
+    """
+
+    df.columns = [correct_column_name(column) for column in df.columns]
+
+    return df
+
+
+def convert_string_to_float_columns(list_of_columns: list, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function corrects column types for dataframes with float numbers incorrectly using the ',' character instead of '.' to express numeric precision. It converts them from string to float by correcting the character.
+
+    Args: 
+        - list_of_columns: list of strings with the names of columns to be treated.
+        - df: pd.Dataframe to be treated.
+
+    Returns:
+        df: Pandas DataFrame with corrected column types.
+    """
+
+    for column in list_of_columns:
+        df[column] = df[column].str.replace(',', '.').astype(float)
+
+    return df
+
+
+def add_updated_at_column(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds column with 'updated_at' column that will be necessary for scheduling the incremental loads.
+
+    Args: 
+        - df: dataframe to receive the column.
+
+    Returns:
+        - df: dataframe with new column.
+    """
+    current_datetime = datetime.now().date()
+
+    df['updated_at'] = current_datetime
+
+    return df
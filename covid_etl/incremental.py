@@ -0,0 +1,438 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import register_adapter, AsIs
+
+from covid_etl import memory_budget, weekly_fact
+from covid_etl.config import COVID_SCHEMA_NAME, COVID_TABLE_NAME, DATABASE_NAME
+from covid_etl.db import connect_to_postgres, create_connection_pool
+from covid_etl.extract import get_national_14day_covid_data, spill_national_14day_covid_data, standardize_column_names
+
+TODAY = datetime.now().date()
+
+YESTERDAY = TODAY - timedelta(days=1)
+
+register_adapter(np.int64, AsIs)
+
+# Columns of the upsert, in the order of its placeholders.
+UPSERT_COLS = ["country", "country_code", "continent", "population", "indicator", "year_week", "source", "note",
+               "weekly_count", "cumulative_count", "rate_14_day", "updated_at"]
+
+# Conflict key of the upsert. Rows sharing it always land in the same shard.
+CONFLICT_KEY_COLS = ["country", "year_week", "indicator"]
+
+# Number of connections applying the upsert concurrently. 1 keeps the upsert on a single connection.
+# Read by get_upsert_workers when the incremental load runs, from COVID_ETL_UPSERT_WORKERS if set.
+UPSERT_WORKERS = 1
+
+UPSERT_MAX_ATTEMPTS = 3
+
+UPSERT_RETRY_DELAY_SECONDS = 2
+
+
+def transform_phase(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Executes all relevant transformation to the dataframe prior to the load.
+
+    Args:
+        - df: pd.Dataframe to be treated.
+
+    Returns:
+        transformed_df: Pandas DataFrame with final transformations.
+    """
+
+    transformed_df = standardize_column_names(df)
+    transformed_df['country'] = df['country'].str.strip()
+    transformed_df['updated_at'] = TODAY
+
+    return transformed_df
+
+
+def get_database_latest(schema_name: str, table_name: str, chunksize=None) -> pd.DataFrame:
+    """
+    Retrieves the latest updated data from PostgreSQL database.
+
+    Args:
+        - schema_name: string containing the schema name of the updated table.
+        - table_name:  string containg the table_name for the updated table. 
+        - chunksize: optional number of rows per chunk. When set, an iterator of dataframes is returned instead of a single dataframe.
+
+    Returns:
+        db_df: dataframe with the latest daa from the PostgreSQL database. 
+    """
+
+    sql_query = f"SELECT country, country_code, continent, population, 'indicator', year_week, source, note, weekly_count, cumulative_count, rate_14_day FROM {schema_name}.{table_name} WHERE updated_at = CAST('{YESTERDAY}' AS DATE)"
+
+    try:
+        conn = connect_to_postgres(database=DATABASE_NAME)
+        if chunksize:
+            # Chunks are fetched lazily, so the connection is closed by the caller through the iterator.
+            return read_sql_chunks(sql_query, conn, chunksize)
+        db_df = pd.read_sql(sql_query, conn)
+    except Exception as e:
+        print(f"Erro ao carregar os dados do banco de dados: {str(e)}")
+
+    conn.close()
+
+    return db_df
+
+
+def read_sql_chunks(sql_query: str, conn, chunksize: int):
+    """
+    Yields the result of a query in chunks, closing the connection once all chunks were read. The query runs on a server-side (named) cursor, so only one chunk of rows is held in memory at a time. A client-side cursor, as used by pd.read_sql, downloads the whole result set on execute.
+
+    Args:
+        - sql_query: string containing the query to be executed.
+        - conn: psycopg2.connection object used to run the query.
+        - chunksize: number of rows per chunk.
+    """
+    try:
+        # Named cursors only live inside a transaction.
+        conn.autocommit = False
+        with conn.cursor(name="read_sql_chunks") as cursor:
+            cursor.itersize = chunksize
+            cursor.execute(sql_query)
+
+            rows = cursor.fetchmany(chunksize)
+            columns = [column[0] for column in cursor.description]
+            # Like pd.read_sql, an empty result still yields one empty chunk carrying the columns.
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    finally:
+        conn.close()
+
+
+def spill_database_latest(database_store: memory_budget.SpillStore, schema_name: str, table_name: str, chunksize: int) -> None:
+    """
+    Retrieves the latest updated data from PostgreSQL database in chunks and spills it to disk, partitioned by country.
+
+    Args:
+        - database_store: SpillStore receiving the latest data from the PostgreSQL database.
+        - schema_name: string containing the schema name of the updated table.
+        - table_name:  string containg the table_name for the updated table.
+        - chunksize: number of rows fetched at a time.
+    """
+    for chunk in get_database_latest(schema_name, table_name, chunksize=chunksize):
+        database_store.write(chunk, key_cols=['country'])
+
+
+def search_updates(extracted_df: pd.DataFrame, database_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Searches for the rows to update the database based on new extraction.
+
+    Args:
+        - extracted_df: dataframe from daily extraction from source.
+        - database_df: dataframe from database to be updated.
+
+    Returns:
+        diff_df: dataframe with the rows that will update the database.
+    """
+
+    diff_df = extracted_df.merge(database_df, on=["country", "year_week"], how="left", suffixes=('', '_x'))
+
+    # Filters lines that were extracted but are no in the database
+    diff_df = diff_df[diff_df.isna().any(axis=1)]
+
+    # Maintains only lines that differ
+    extraction_columns = [col for col in diff_df.columns if not col.endswith("_x")]
+
+    # Updates the dataframe to have only the different rows and columns.
+    diff_df = diff_df[extraction_columns]
+
+    diff_df = diff_df.drop(columns=['?column?'])
+
+    return diff_df
+
+
+def search_updates_spilled(extracted_store: memory_budget.SpillStore, database_store: memory_budget.SpillStore, diff_store: memory_budget.SpillStore) -> None:
+    """
+    Searches for the rows to update the database one partition at a time. Both stores must be partitioned by country, so that every pair of matching rows lands in the same partition.
+
+    Args:
+        - extracted_store: SpillStore with the daily extraction from source.
+        - database_store: SpillStore with the data from database to be updated.
+        - diff_store: SpillStore receiving the rows that will update the database.
+    """
+    for partition in extracted_store.partitions():
+        diff_df = search_updates(extracted_store.read(partition), database_store.read(partition))
+        diff_store.write(diff_df)
+
+
+def build_upsert_sql(schema_name: str, table_name: str) -> str:
+    """
+    Builds the INSERT INTO ON CONFLICT command used to upsert rows into the database.
+
+    Args:
+        - schema_name: name of the schema with the table to be altered.
+        - table_name: name of the table to be altered.
+
+    Returns:
+        sql: string containing the upsert command, with one placeholder per column.
+    """
+    return f"""
+    INSERT INTO {schema_name}.{table_name} (country, country_code, continent, population, "indicator", year_week, source, note, weekly_count, cumulative_count, rate_14_day, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (country, year_week, "indicator") DO UPDATE
+    SET 
+        country = EXCLUDED.country,
+        country_code = EXCLUDED.country_code,
+        continent = EXCLUDED.continent,
+        population = EXCLUDED.population,
+        "indicator" = EXCLUDED."indicator",
+        year_week = EXCLUDED.year_week,
+        source = EXCLUDED.source,
+        note = EXCLUDED.note,
+        weekly_count = EXCLUDED.weekly_count,
+        cumulative_count = EXCLUDED.cumulative_count,
+        rate_14_day = EXCLUDED.rate_14_day,
+        updated_at = EXCLUDED.updated_at
+    """
+
+
+def execute_upsert_batches(cursor, sql: str, diff_df: pd.DataFrame) -> None:
+    """
+    Executes the upsert command for every row of a dataframe, in batches sized by the memory budget.
+
+    Args:
+        - cursor: psycopg2 cursor used to execute the command.
+        - sql: string containing the upsert command.
+        - diff_df: dataframe with rows to be updated or inserted into database.
+    """
+    chunk_rows = memory_budget.chunk_rows_for(diff_df) or max(len(diff_df), 1)
+
+    for chunk in memory_budget.iter_chunks(diff_df, chunk_rows):
+        # Converts DataFrame to list of tuples
+        data_to_update = [tuple(row) for row in chunk[UPSERT_COLS].to_records(index=False)]
+        cursor.executemany(sql, data_to_update)
+
+
+def upsert_to_database(diff_df: pd.DataFrame, schema_name: str, table_name: str) -> None:
+    """
+    Inserts and updates new and altered rows into the database.
+
+    Args: 
+        - diff_df: dataframe with rows to be updated or inserted into database, or an iterable of dataframes such as a SpillStore.
+        - schema_name: name of the schema with the table to be altered.
+        - table_name: name of the table to be altered.
+    """
+
+    diff_frames = [diff_df] if isinstance(diff_df, pd.DataFrame) else diff_df
+
+    sql = build_upsert_sql(schema_name, table_name)
+
+    try:
+        conn = connect_to_postgres(database=DATABASE_NAME)
+        cursor = conn.cursor()
+
+        for frame in diff_frames:
+            execute_upsert_batches(cursor, sql, frame)
+
+        conn.commit()
+    except:
+        raise
+
+    conn.close()
+
+
+def shard_by_conflict_key(diff_df: pd.DataFrame, n_shards: int) -> list:
+    """
+    Splits the rows to upsert into shards by a hash of the conflict key, so that no two shards touch the same row of the table.
+
+    Args:
+        - diff_df: dataframe with rows to be updated or inserted into database.
+        - n_shards: number of shards to split the rows into.
+
+    Returns:
+        shards: list of non empty dataframes, one per shard.
+    """
+    hashes = pd.util.hash_pandas_object(diff_df[CONFLICT_KEY_COLS], index=False)
+    shard_ids = hashes % n_shards
+
+    return [shard_df for _, shard_df in diff_df.groupby(shard_ids.values, sort=False)]
+
+
+def upsert_shard(pool, sql: str, shard_df: pd.DataFrame) -> int:
+    """
+    Upserts one shard in its own transaction, retrying it when the connection or the transaction fails.
+
+    Args:
+        - pool: psycopg2.pool.ThreadedConnectionPool the connection is taken from.
+        - sql: string containing the upsert command.
+        - shard_df: dataframe with the rows of the shard.
+
+    Returns:
+        int: number of rows upserted.
+    """
+    for attempt in range(1, UPSERT_MAX_ATTEMPTS + 1):
+        conn = None
+        try:
+            # Taking the connection is part of the attempt, so a failed connection is retried too.
+            conn = pool.getconn()
+            with conn.cursor() as cursor:
+                execute_upsert_batches(cursor, sql, shard_df)
+            conn.commit()
+            return len(shard_df)
+        # Covers dropped connections as well as serialization failures and deadlocks (TransactionRollbackError).
+        except psycopg2.OperationalError as error:
+            if attempt == UPSERT_MAX_ATTEMPTS:
+                raise
+            print(f"Shard upsert of {len(shard_df)} rows failed (attempt {attempt} of {UPSERT_MAX_ATTEMPTS}): {str(error).strip()}")
+        finally:
+            if conn is not None:
+                release_connection(pool, conn)
+
+        time.sleep(UPSERT_RETRY_DELAY_SECONDS * attempt)
+
+
+def release_connection(pool, conn) -> None:
+    """
+    Rolls back whatever a shard left open on a connection and returns it to the pool. Connections that are closed or fail to roll back are discarded, without hiding the error that made the shard fail.
+
+    Args:
+        - pool: psycopg2.pool.ThreadedConnectionPool the connection was taken from.
+        - conn: psycopg2.connection object to be returned.
+    """
+    broken = bool(conn.closed)
+
+    if not broken:
+        try:
+            # After a commit this is a no-op.
+            conn.rollback()
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            broken = True
+
+    pool.putconn(conn, close=broken)
+
+
+def upsert_to_database_parallel(diff_df: pd.DataFrame, schema_name: str, table_name: str, workers: int) -> None:
+    """
+    Inserts and updates new and altered rows into the database over several connections at once. The rows are sharded by a hash of the conflict key (country, year_week, indicator), so concurrent shards never lock the same rows and cannot deadlock each other. Each shard is applied and retried in its own transaction.
+
+    Unlike upsert_to_database, the upsert is not atomic: if a shard still fails after its retries, the error is raised but the shards that already succeeded stay committed. Since the upsert is idempotent, running the load again completes it.
+
+    Args: 
+        - diff_df: dataframe with rows to be updated or inserted into database, or an iterable of dataframes such as a SpillStore.
+        - schema_name: name of the schema with the table to be altered.
+        - table_name: name of the table to be altered.
+        - workers: number of connections applying shards concurrently.
+    """
+
+    diff_frames = [diff_df] if isinstance(diff_df, pd.DataFrame) else diff_df
+
+    sql = build_upsert_sql(schema_name, table_name)
+    pool = create_connection_pool(workers)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Frames are upserted one after the other, so that rows of different frames are never applied concurrently.
+            for frame in diff_frames:
+                if frame.empty:
+                    continue
+                futures = [executor.submit(upsert_shard, pool, sql, shard_df)
+                           for shard_df in shard_by_conflict_key(frame, workers)]
+                for future in futures:
+                    future.result()
+    finally:
+        pool.closeall()
+
+
+def upsert(diff_df: pd.DataFrame, schema_name: str, table_name: str, workers: int) -> None:
+    """
+    Upserts the rows over a single connection, or in parallel shards when more than one worker is requested.
+
+    Args:
+        - diff_df: dataframe with rows to be updated or inserted into database, or an iterable of dataframes such as a SpillStore.
+        - schema_name: name of the schema with the table to be altered.
+        - table_name: name of the table to be altered.
+        - workers: number of connections applying the upsert.
+    """
+    if workers > 1:
+        upsert_to_database_parallel(diff_df, schema_name, table_name, workers)
+    else:
+        upsert_to_database(diff_df, schema_name, table_name)
+
+
+def get_upsert_workers(upsert_workers=None) -> int:
+    """
+    Resolves the number of connections applying the upsert.
+
+    Args:
+        - upsert_workers: optional number of connections requested by the caller. Standard value is None, in which case the COVID_ETL_UPSERT_WORKERS environment variable is read, falling back to UPSERT_WORKERS.
+
+    Returns:
+        int: number of connections, at least 1.
+
+    Raises:
+        ValueError: if the number of connections is not a positive integer.
+    """
+    if upsert_workers is None:
+        upsert_workers = os.environ.get("COVID_ETL_UPSERT_WORKERS") or UPSERT_WORKERS
+
+    message = f"The number of upsert workers must be a positive integer, got {upsert_workers!r}"
+    try:
+        workers = int(upsert_workers)
+    except (TypeError, ValueError):
+        raise ValueError(message) from None
+
+    if workers < 1:
+        raise ValueError(message)
+
+    return workers
+
+
+def main(upsert_workers=None):
+    """
+    Executes the ETL.
+
+    Args:
+        - upsert_workers: optional number of connections applying the upsert concurrently. Standard value is None, in which case COVID_ETL_UPSERT_WORKERS or UPSERT_WORKERS is used.
+    """
+    schema_name = COVID_SCHEMA_NAME
+    table_name = COVID_TABLE_NAME
+    upsert_workers = get_upsert_workers(upsert_workers)
+
+    if memory_budget.get_memory_budget_bytes() is None:
+        extract_df = get_national_14day_covid_data()
+        transformed_extract_df = transform_phase(extract_df)
+        database_df = get_database_latest(schema_name, table_name)
+        updates_df = search_updates(transformed_extract_df, database_df)
+        upsert(updates_df, schema_name, table_name, upsert_workers)
+        updated_country_codes = set(updates_df['country_code'].dropna())
+        updated_missing_codes = bool(updates_df['country_code'].isna().any())
+    else:
+        # The download is streamed to disk and every stage works one partition at a time.
+        # The stores remove their files on exit, also when a stage fails.
+        with memory_budget.SpillStore('extracted') as extracted_store, \
+                memory_budget.SpillStore('database_latest') as database_store, \
+                memory_budget.SpillStore('diff') as diff_store:
+            chunk_rows = spill_national_14day_covid_data(
+                extracted_store, transform=transform_phase, key_cols=['country'])
+            spill_database_latest(database_store, schema_name, table_name, chunk_rows)
+            search_updates_spilled(extracted_store, database_store, diff_store)
+
+            upsert(diff_store, schema_name, table_name, upsert_workers)
+            updated_country_codes = set()
+            updated_missing_codes = False
+            for frame in diff_store:
+                updated_country_codes.update(frame['country_code'].dropna())
+                updated_missing_codes = updated_missing_codes or bool(frame['country_code'].isna().any())
+
+    # Only the weeks of the countries that changed need to be aligned again. The aggregates have no code, so they are
+    # refreshed all together whenever one of them changed.
+    weekly_fact.refresh_weekly_fact(country_codes=updated_country_codes, include_missing_codes=updated_missing_codes)
+
+    memory_budget.report_peak_rss()
+
+
+if __name__ == "__main__":
+    main()
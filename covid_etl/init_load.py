@@ -0,0 +1,170 @@
+import pandas as pd
+
+from covid_etl import memory_budget
+from covid_etl.config import (COUNTRIES_CSV_PATH, COUNTRY_SCHEMA_NAME, COUNTRY_TABLE_NAME, COVID_SCHEMA_NAME,
+                              COVID_TABLE_NAME, DATABASE_NAME)
+from covid_etl.db import create_sql_script, execute_create_sql_command, insert_dataframe_to_postgres
+from covid_etl.extract import (add_updated_at_column, convert_string_to_float_columns, get_national_14day_covid_data,
+                               spill_national_14day_covid_data, standardize_column_names)
+
+COUNTRY_STRING_TO_FLOAT_COLUMNS = ["pop_density_per_sq_mi", "coastline_coastarea_ratio", "net_migration", "infant_mortality_per_1000_births",
+                                   "literacy", "phones_per_1000", "arable", "crops", "other", "birthrate", "deathrate", "agriculture", "industry", "service"]
+
+
+def main():
+    """
+    Calls all functions relevant to perform database creation and first load of the datasets.
+    """
+
+    create_db()
+    create_schema(COVID_SCHEMA_NAME)
+    create_schema(COUNTRY_SCHEMA_NAME)
+
+    # updated_at is declared as DATE even when the table is created from an empty frame, which holds no dates to infer it from.
+    covid_table_params = {"schema_name": COVID_SCHEMA_NAME,
+                          "table_name": COVID_TABLE_NAME,
+                          "primary_key_cols": ["country", "year_week", "indicator"],
+                          "column_types": {"updated_at": "DATE"}}
+
+    country_table_params = {
+        "schema_name": COUNTRY_SCHEMA_NAME,
+        "table_name": COUNTRY_TABLE_NAME,
+        "primary_key_cols": ["country"]
+    }
+
+    if memory_budget.get_memory_budget_bytes() is None:
+        transformed_covid_df, transformed_country_df = execute_extract_transform()
+
+        # Appends to the table created above, as the budgeted load does, so that both keep its column types and primary key.
+        create_table(transformed_covid_df, covid_table_params)
+        insert_dataframe_to_postgres(
+            transformed_covid_df, covid_table_params['table_name'], covid_table_params['schema_name'], if_exists='append',
+            chunksize=memory_budget.chunk_rows_for(transformed_covid_df))
+    else:
+        transformed_country_df = transform_phase(
+            pd.read_csv(COUNTRIES_CSV_PATH), COUNTRY_STRING_TO_FLOAT_COLUMNS)
+
+        # The download is streamed to disk and loaded one chunk at a time. The store removes its files on exit, also when a stage fails.
+        with memory_budget.SpillStore('extracted') as covid_store:
+            spill_national_14day_covid_data(covid_store, transform=transform_phase)
+            create_table(covid_store.schema_frame(), covid_table_params,
+                         nullable_columns=covid_store.nullable_columns)
+
+            # Appends to the table created above, so that its column types and primary key are kept.
+            for chunk in covid_store:
+                insert_dataframe_to_postgres(
+                    chunk, covid_table_params['table_name'], covid_table_params['schema_name'], if_exists='append')
+
+    create_table(transformed_country_df, country_table_params)
+    insert_dataframe_to_postgres(
+        transformed_country_df, country_table_params['table_name'], country_table_params['schema_name'],
+        chunksize=memory_budget.chunk_rows_for(transformed_country_df))
+
+    memory_budget.report_peak_rss()
+
+
+def extract_phase() -> pd.DataFrame:
+    """
+    This function executes de Extraction phase for the first run of the ETL.
+
+    Returns:
+        df_covid_data: pd.DataFrame with data on 14-day notification rate of new COVID-19 cases and deaths and deaths.
+        df_country_data: pd.DataFrame with socioeconomic data on countries of the world.
+    """
+    df_covid_data = get_national_14day_covid_data()
+    df_country_data = pd.read_csv(COUNTRIES_CSV_PATH)
+
+    return df_covid_data, df_country_data
+
+
+def transform_phase(df: pd.DataFrame, string_to_float_columns_list=None) -> pd.DataFrame:
+    """
+    This function executes all relevant transformation to the dataframes prior to the initial load.
+
+    Args: 
+        - df: pd.Dataframe to be treated.
+        - string_to_float_columns_list: list of strings with the names of columns to be treated from string to float types. Standard value is None, in case there are no columns with string to float conversions to be made.
+
+    Returns:
+       transformed_df: Pandas DataFrame with final transformations.
+    """
+
+    transformed_df = standardize_column_names(df)
+
+    if string_to_float_columns_list:
+        transformed_df = convert_string_to_float_columns(
+            string_to_float_columns_list, transformed_df)
+
+    transformed_updated_df = add_updated_at_column(transformed_df)
+
+    return transformed_updated_df
+
+
+def create_db() -> None:
+    """
+    Creates our database.
+    """
+    params = {
+        "object_name": DATABASE_NAME,
+        "object_type": "database"
+    }
+    execute_create_sql_command(**params)
+
+
+def create_schema(schema_name: str) -> None:
+    """
+    Creates the schemas for our datasets.
+    Args:
+        - schema_name: name of the schema we want to create for our datasets.
+    """
+
+    params = {
+        "object_name": schema_name,
+        "object_type": "schema"
+    }
+
+    execute_create_sql_command(**params)
+
+
+def execute_extract_transform() -> pd.DataFrame:
+    """
+    Executes every transformation relevant to the datasets by calling other functions.
+
+    Returns:
+        - transformed_covid_data: trasnformed dataset with covid cases and death information.
+        - transformed_country_data: transformed dataset with country information.
+    """
+
+    df_covid_data, df_country_data = extract_phase()
+
+    transformed_covid_data = transform_phase(df_covid_data)
+    transformed_country_data = transform_phase(
+        df_country_data, COUNTRY_STRING_TO_FLOAT_COLUMNS)
+
+    return transformed_covid_data, transformed_country_data
+
+
+def create_table(df: pd.DataFrame, table_params: dict, nullable_columns=None):
+    """
+    Calls function to create SQL cript with CREATE TABLE command and executes it in order to create tables.
+
+    Args:
+        - df: dataframe that originates the table.
+        - table_params: parameters necessary for creating the script. 
+        - nullable_columns: optional collection of column names to be declared NULL regardless of the values in df.
+    """
+
+    script_table = create_sql_script(df, nullable_columns=nullable_columns, **table_params)
+
+    sql_params = {
+        "object_name": table_params['table_name'],
+        "object_type": "table",
+        "schema_name": table_params['schema_name'],
+        "create_table_sql": script_table
+    }
+
+    execute_create_sql_command(**sql_params)
+
+
+if __name__ == "__main__":
+    main()
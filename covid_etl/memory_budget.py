@@ -0,0 +1,292 @@
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; RSS is then read from /proc or reported as unknown.
+    resource = None
+
+# Global memory budget for a run, in megabytes. None keeps the whole pipeline in memory.
+MEMORY_BUDGET_MB = os.environ.get("COVID_ETL_MEMORY_BUDGET_MB")
+
+# Fraction of the budget a single in-memory chunk is allowed to take.
+CHUNK_BUDGET_FRACTION = 0.1
+
+# Number of hash partitions used when spilling keyed data to disk.
+SPILL_PARTITIONS = 16
+
+# Directory that receives spilled partitions. None uses the system temporary directory.
+SPILL_DIR = os.environ.get("COVID_ETL_SPILL_DIR")
+
+MIN_CHUNK_ROWS = 1000
+
+
+def set_memory_budget(megabytes) -> None:
+    """
+    Sets the global memory budget for the run.
+
+    Args:
+        - megabytes: budget in megabytes. None disables the budget and keeps every stage in memory.
+    """
+    global MEMORY_BUDGET_MB
+    MEMORY_BUDGET_MB = megabytes
+
+
+def get_memory_budget_bytes():
+    """
+    Returns the global memory budget in bytes, or None when no budget is set.
+    """
+    if MEMORY_BUDGET_MB in (None, ""):
+        return None
+
+    return int(float(MEMORY_BUDGET_MB) * 1024 * 1024)
+
+
+def current_rss_bytes() -> int:
+    """
+    Returns the current resident set size of the process in bytes. Falls back to the peak RSS where the current value cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """
+    Returns the peak resident set size of the process in bytes, or 0 when it cannot be measured.
+    """
+    if resource is None:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    if sys.platform == "darwin":
+        return peak
+
+    return peak * 1024
+
+
+def exceeds_budget(estimated_bytes=0) -> bool:
+    """
+    Checks whether a stage that needs an extra amount of memory would go over the budget.
+
+    Args:
+        - estimated_bytes: additional memory the stage is expected to allocate.
+
+    Returns:
+        bool: True if a budget is set and current RSS plus the estimate exceed it.
+    """
+    budget = get_memory_budget_bytes()
+    if budget is None:
+        return False
+
+    return current_rss_bytes() + estimated_bytes > budget
+
+
+def dataframe_bytes(df: pd.DataFrame) -> int:
+    """
+    Returns the deep memory usage of a dataframe in bytes.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def rows_per_chunk(bytes_per_row: float) -> int:
+    """
+    Computes how many rows fit in a single chunk given the memory budget.
+
+    Args:
+        - bytes_per_row: estimated memory taken by one row.
+
+    Returns:
+        int: number of rows per chunk, never lower than MIN_CHUNK_ROWS.
+    """
+    budget = get_memory_budget_bytes()
+    if budget is None or bytes_per_row <= 0:
+        return MIN_CHUNK_ROWS
+
+    return max(MIN_CHUNK_ROWS, int(budget * CHUNK_BUDGET_FRACTION / bytes_per_row))
+
+
+def chunk_rows_for(df: pd.DataFrame, work_factor=1):
+    """
+    Decides whether a stage working on a dataframe must be chunked.
+
+    Args:
+        - df: dataframe the stage works on.
+        - work_factor: how many copies of the dataframe the stage is expected to allocate.
+
+    Returns:
+        int: number of rows per chunk, or None if the stage fits in the budget and can run in memory.
+    """
+    if df.empty:
+        return None
+
+    df_bytes = dataframe_bytes(df)
+    if not exceeds_budget(df_bytes * work_factor):
+        return None
+
+    return rows_per_chunk(df_bytes / len(df))
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int):
+    """
+    Yields consecutive row slices of a dataframe.
+
+    Args:
+        - df: dataframe to be sliced.
+        - chunk_rows: number of rows in each slice.
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+class SpillStore:
+    """
+    Keeps intermediate dataframe partitions on local disk instead of in memory.
+
+    Frames written with key columns are hash partitioned on them, so frames from two stores
+    partitioned on the same keys can be joined partition by partition. Frames written without
+    keys are stored as partitions of their own, in write order. The column types and the
+    columns holding nulls are collected across every written frame.
+
+    Used as a context manager, the store removes its files on exit, whether or not the block raised.
+    """
+
+    def __init__(self, name: str, n_partitions=SPILL_PARTITIONS):
+        self.name = name
+        self.n_partitions = n_partitions
+        self.columns = None
+        self.dtypes = {}
+        self.nullable_columns = set()
+        self.directory = tempfile.mkdtemp(
+            prefix=f"covid_etl_{name}_", dir=SPILL_DIR)
+        self._next_partition = 0
+        self._sequence = 0
+
+    def write(self, df: pd.DataFrame, key_cols=None) -> None:
+        """
+        Spills a dataframe to disk.
+
+        Args:
+            - df: dataframe to be spilled.
+            - key_cols: optional list of columns to hash partition the rows on.
+        """
+        if self.columns is None:
+            self.columns = list(df.columns)
+
+        if df.empty:
+            return
+
+        for column in df.columns:
+            self.dtypes[column] = widen_dtype(self.dtypes.get(column), df[column].dtype)
+        self.nullable_columns.update(df.columns[df.isna().any()])
+
+        if key_cols:
+            hashes = pd.util.hash_pandas_object(df[key_cols], index=False)
+            partition_ids = hashes % self.n_partitions
+            for partition, partition_df in df.groupby(partition_ids.values, sort=False):
+                self._write_partition(partition_df, int(partition))
+        else:
+            self._write_partition(df, self._next_partition)
+            self._next_partition += 1
+
+    def path(self, file_name: str) -> str:
+        """
+        Returns the path of a file kept in the store's directory, e.g. a raw download, so that it is removed along with the partitions.
+        """
+        return os.path.join(self.directory, file_name)
+
+    def schema_frame(self) -> pd.DataFrame:
+        """
+        Returns an empty dataframe with the column types common to every written frame.
+        """
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in self.dtypes.items()})
+
+    def _write_partition(self, df: pd.DataFrame, partition: int) -> None:
+        path = os.path.join(
+            self.directory, f"p{partition:05d}-{self._sequence:07d}.pkl")
+        df.to_pickle(path)
+        self._sequence += 1
+
+    def partitions(self) -> list:
+        """
+        Returns the sorted list of partition numbers that hold data.
+        """
+        files = glob.glob(os.path.join(self.directory, "p*.pkl"))
+        return sorted({int(os.path.basename(path)[1:6]) for path in files})
+
+    def read(self, partition: int) -> pd.DataFrame:
+        """
+        Loads a single partition back into memory.
+
+        Args:
+            - partition: number of the partition to be loaded.
+
+        Returns:
+            pd.DataFrame: rows of the partition, or an empty dataframe with the store's columns if the partition holds no data.
+        """
+        files = sorted(glob.glob(os.path.join(
+            self.directory, f"p{partition:05d}-*.pkl")))
+        if not files:
+            return pd.DataFrame(columns=self.columns)
+
+        return pd.concat([pd.read_pickle(path) for path in files], ignore_index=True)
+
+    def __iter__(self):
+        for partition in self.partitions():
+            yield self.read(partition)
+
+    def cleanup(self) -> None:
+        """
+        Removes the spilled partitions from disk.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+
+def widen_dtype(current_dtype, chunk_dtype):
+    """
+    Returns a column type able to hold the values of both chunks, e.g. float64 for a column read as int64 in one chunk and float64 in another.
+
+    Args:
+        - current_dtype: type collected from the previous chunks, or None for the first chunk.
+        - chunk_dtype: type of the column in the current chunk.
+    """
+    if current_dtype is None or current_dtype == chunk_dtype:
+        return chunk_dtype
+
+    try:
+        return np.result_type(current_dtype, chunk_dtype)
+    except TypeError:
+        return np.dtype(object)
+
+
+def report_peak_rss() -> None:
+    """
+    Prints the peak RSS of the run against the memory budget.
+    """
+    peak_mb = peak_rss_bytes() / (1024 * 1024)
+    budget = get_memory_budget_bytes()
+
+    if budget is None:
+        print(f"Peak RSS: {peak_mb:.1f} MB (no memory budget set)")
+    else:
+        budget_mb = budget / (1024 * 1024)
+        print(
+            f"Peak RSS: {peak_mb:.1f} MB of {budget_mb:.1f} MB budget ({peak_mb / budget_mb:.0%})")
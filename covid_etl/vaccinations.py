@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+
+from covid_etl import memory_budget, weekly_fact
+from covid_etl.config import COVID_SCHEMA_NAME, VACCINATION_CSV_PATH, VACCINATION_TABLE_NAME
+from covid_etl.db import create_sql_script, execute_create_sql_command, insert_dataframe_to_postgres
+
+# Rows read to estimate the in-memory size of the vaccination dataset.
+VACCINATION_SAMPLE_ROWS = 1000
+
+
+def main() -> None:
+    """
+    Executes the load pipeline.
+    """
+    schema_name = COVID_SCHEMA_NAME
+    table_name = VACCINATION_TABLE_NAME
+    primary_key_cols = ['iso_code', 'location', 'date']
+
+    chunk_rows = get_vaccine_data_chunk_rows()
+
+    if chunk_rows is None:
+        vaccine_df = get_covid_vaccine_data()
+        create_table_sql = create_sql_script(df=vaccine_df, schema_name=schema_name, table_name=table_name, primary_key_cols=primary_key_cols)
+        execute_create_sql_command(object_name=table_name, object_type="table", schema_name=schema_name, create_table_sql=create_table_sql)
+        insert_dataframe_to_postgres(df=vaccine_df, schema_name=schema_name, table_name=table_name)
+    else:
+        with memory_budget.SpillStore('vaccination') as vaccine_store:
+            spill_covid_vaccine_data(vaccine_store, chunk_rows)
+            create_table_sql = create_sql_script(df=vaccine_store.schema_frame(), schema_name=schema_name, table_name=table_name, primary_key_cols=primary_key_cols, nullable_columns=vaccine_store.nullable_columns)
+            execute_create_sql_command(object_name=table_name, object_type="table", schema_name=schema_name, create_table_sql=create_table_sql)
+
+            # Appends to the table created above, so that its column types and primary key are kept.
+            for chunk in vaccine_store:
+                insert_dataframe_to_postgres(df=chunk, schema_name=schema_name, table_name=table_name, if_exists='append')
+
+    # The dataset is reloaded as a whole, so every country is aligned again; only changed weeks are written.
+    weekly_fact.refresh_weekly_fact()
+
+    memory_budget.report_peak_rss()
+
+
+def get_covid_vaccine_data() -> pd.DataFrame:
+    """
+    Uploads the csv file for the datasource.
+
+    Returns:
+        df_covid: pd.DataFrame with data on covid-19 vaccination across the globe.
+    """
+    df_covid = pd.read_csv(VACCINATION_CSV_PATH)
+
+    return df_covid
+
+
+def get_vaccine_data_chunk_rows():
+    """
+    Estimates the in-memory size of the datasource from a sample of its rows and decides whether it has to be loaded in chunks.
+
+    Returns:
+        chunk_rows: number of rows per chunk, or None if the whole dataset fits in the memory budget.
+    """
+    if memory_budget.get_memory_budget_bytes() is None:
+        return None
+
+    sample_df = pd.read_csv(VACCINATION_CSV_PATH, nrows=VACCINATION_SAMPLE_ROWS)
+    if sample_df.empty:
+        return None
+
+    bytes_per_row = memory_budget.dataframe_bytes(sample_df) / len(sample_df)
+    sample_file_bytes = len(sample_df.to_csv(index=False).encode())
+    estimated_rows = os.path.getsize(VACCINATION_CSV_PATH) * len(sample_df) / sample_file_bytes
+
+    # Creating the table and writing it to the database hold roughly two copies of the dataset.
+    if not memory_budget.exceeds_budget(2 * bytes_per_row * estimated_rows):
+        return None
+
+    return memory_budget.rows_per_chunk(bytes_per_row)
+
+
+def spill_covid_vaccine_data(vaccine_store: memory_budget.SpillStore, chunk_rows: int) -> None:
+    """
+    Reads the csv file for the datasource in chunks, spilling every chunk to disk. The store collects the column types and nullability of the whole dataset along the way.
+
+    Args:
+        - vaccine_store: SpillStore receiving the chunks of the dataset, in file order.
+        - chunk_rows: number of rows read at a time.
+    """
+    for chunk in pd.read_csv(VACCINATION_CSV_PATH, chunksize=chunk_rows):
+        vaccine_store.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+from datetime import datetime
+
+import pandas as pd
+
+from covid_etl import memory_budget
+from covid_etl.config import (COVID_SCHEMA_NAME, COVID_TABLE_NAME, DATABASE_NAME, VACCINATION_TABLE_NAME,
+                              WEEKLY_FACT_TABLE_NAME)
+from covid_etl.db import connect_to_postgres
+
+FACT_KEY_COLS = ["country", "year_week"]
+
+# Daily OWID measures aligned to the ECDC weeks.
+VACCINATION_COLS = ["people_vaccinated_per_hundred", "people_fully_vaccinated_per_hundred", "gdp_per_capita"]
+
+FACT_TEXT_COLS = ["country", "year_week", "country_code", "continent"]
+FACT_DATE_COLS = ["week_end_date"]
+FACT_NUMERIC_COLS = ["population", "weekly_cases", "cumulative_cases", "weekly_deaths", "cumulative_deaths"] + VACCINATION_COLS
+
+FACT_COLS = ["country", "year_week", "week_end_date", "country_code", "continent", "population", "weekly_cases",
+             "cumulative_cases", "weekly_deaths", "cumulative_deaths"] + VACCINATION_COLS + ["updated_at"]
+
+# Rough in-memory size of one ECDC or OWID row read by the refresh, counting the copies made by the pivot, the as-of join
+# and the diff. Used to split the refresh into batches of countries under a memory budget.
+FACT_REFRESH_ROW_BYTES = 1000
+
+CREATE_FACT_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {COVID_SCHEMA_NAME}.{WEEKLY_FACT_TABLE_NAME} (
+    country TEXT NOT NULL,
+    year_week TEXT NOT NULL,
+    week_end_date DATE NOT NULL,
+    country_code TEXT NULL,
+    continent TEXT NULL,
+    population BIGINT NULL,
+    weekly_cases DOUBLE PRECISION NULL,
+    cumulative_cases DOUBLE PRECISION NULL,
+    weekly_deaths DOUBLE PRECISION NULL,
+    cumulative_deaths DOUBLE PRECISION NULL,
+    people_vaccinated_per_hundred DOUBLE PRECISION NULL,
+    people_fully_vaccinated_per_hundred DOUBLE PRECISION NULL,
+    gdp_per_capita DOUBLE PRECISION NULL,
+    updated_at DATE NOT NULL,
+    PRIMARY KEY (country, year_week)
+);
+CREATE INDEX IF NOT EXISTS {WEEKLY_FACT_TABLE_NAME}_year_week_idx ON {COVID_SCHEMA_NAME}.{WEEKLY_FACT_TABLE_NAME} (year_week);
+"""
+
+
+def main() -> None:
+    """
+    Builds or refreshes the weekly fact table from the loaded ECDC and OWID tables.
+    """
+    refresh_weekly_fact()
+
+    memory_budget.report_peak_rss()
+
+
+def iso_week_end_dates(year_week: pd.Series) -> pd.Series:
+    """
+    Converts ECDC 'YYYY-WW' ISO week labels to the date of the Sunday closing each week.
+
+    Args:
+        - year_week: series of ISO week labels, e.g. '2020-31'.
+
+    Returns:
+        pd.Series: datetime series with the last day of every week, NaT for labels that cannot be parsed.
+    """
+    parts = year_week.str.extract(r"^(\d{4})-W?(\d{1,2})$")
+    year = pd.to_numeric(parts[0])
+    week = pd.to_numeric(parts[1])
+
+    # ISO week 1 is the week holding January 4th, so its Monday is January 4th minus its weekday.
+    january_4th = pd.to_datetime(year.astype("Int64").astype(str) + "-01-04", errors="coerce")
+    first_monday = january_4th - pd.to_timedelta(january_4th.dt.weekday, unit="D")
+
+    return first_monday + pd.to_timedelta((week - 1) * 7 + 6, unit="D")
+
+
+def pivot_ecdc_weekly(ecdc_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns the ECDC rows, one per country, week and indicator, into one row per country and week with cases and deaths side by side.
+
+    Args:
+        - ecdc_df: dataframe with the rows of the ECDC table.
+
+    Returns:
+        weekly_df: dataframe keyed by country and year_week.
+    """
+    ecdc_df = ecdc_df[ecdc_df["indicator"].isin(["cases", "deaths"])]
+
+    counts_df = ecdc_df.pivot(index=FACT_KEY_COLS, columns="indicator", values=["weekly_count", "cumulative_count"])
+    counts_df.columns = [f"{value.split('_')[0]}_{indicator}" for value, indicator in counts_df.columns]
+    counts_df = counts_df.reindex(columns=["weekly_cases", "cumulative_cases", "weekly_deaths", "cumulative_deaths"])
+
+    country_df = ecdc_df.groupby(FACT_KEY_COLS)[["country_code", "continent", "population"]].first()
+
+    weekly_df = country_df.join(counts_df).reset_index()
+    weekly_df["week_end_date"] = iso_week_end_dates(weekly_df["year_week"])
+
+    return weekly_df.dropna(subset=["week_end_date"])
+
+
+def align_vaccinations_to_weeks(weekly_df: pd.DataFrame, owid_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aligns the daily OWID rows to the ECDC weeks with an as-of join: every country and week gets the latest OWID values known on or before the last day of the week. Countries are matched by their ISO alpha-3 code, ECDC country_code against OWID iso_code, since their names differ between the two sources.
+
+    Args:
+        - weekly_df: dataframe with one row per country and week, holding the country_code and week_end_date columns.
+        - owid_df: dataframe with the daily OWID rows, holding iso_code, date and VACCINATION_COLS.
+
+    Returns:
+        aligned_df: weekly_df with VACCINATION_COLS added, empty for the weeks of countries without a code or without OWID rows.
+    """
+    # merge_asof needs keys of the same type on both sides, but the types read from the database vary: strings may come
+    # as str or object (always object for an empty result), and dates as datetime.date, parsed with a different resolution.
+    weekly_df = weekly_df.assign(country_code=weekly_df["country_code"].astype(object),
+                                 week_end_date=pd.to_datetime(weekly_df["week_end_date"]).astype("datetime64[ns]"))
+    owid_df = owid_df.assign(iso_code=owid_df["iso_code"].astype(object),
+                             date=pd.to_datetime(owid_df["date"], errors="coerce").astype("datetime64[ns]"))
+    owid_df = owid_df.dropna(subset=["iso_code", "date"]).sort_values(["iso_code", "date"])
+
+    if owid_df.empty:
+        return weekly_df.reindex(columns=list(weekly_df.columns) + VACCINATION_COLS)
+
+    # OWID leaves gaps between reports, so the last reported value of every measure is carried forward.
+    owid_df[VACCINATION_COLS] = owid_df.groupby("iso_code")[VACCINATION_COLS].ffill()
+
+    has_code = weekly_df["country_code"].notna()
+
+    aligned_df = pd.merge_asof(
+        weekly_df[has_code].sort_values("week_end_date"),
+        owid_df[["iso_code", "date"] + VACCINATION_COLS].sort_values("date"),
+        left_on="week_end_date", right_on="date",
+        left_by="country_code", right_by="iso_code",
+        direction="backward")
+
+    return pd.concat([aligned_df.drop(columns=["iso_code", "date"]), weekly_df[~has_code]], ignore_index=True)
+
+
+def build_weekly_fact(ecdc_df: pd.DataFrame, owid_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds the weekly fact table with cases, deaths, vaccination coverage and GDP per capita per country and ISO week.
+
+    Args:
+        - ecdc_df: dataframe with the rows of the ECDC table.
+        - owid_df: dataframe with the daily OWID rows.
+
+    Returns:
+        fact_df: dataframe with the FACT_COLS columns, updated_at excluded.
+    """
+    weekly_df = pivot_ecdc_weekly(ecdc_df)
+    fact_df = align_vaccinations_to_weeks(weekly_df, owid_df)
+
+    return normalize_fact(fact_df)
+
+
+def normalize_fact(fact_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Casts the fact columns to a single type each, so that rows built by pandas and rows read from the database compare equal.
+
+    Args:
+        - fact_df: dataframe with fact rows.
+
+    Returns:
+        fact_df: dataframe with the FACT_COLS columns, updated_at excluded, sorted by country and week.
+    """
+    fact_df = fact_df.copy()
+
+    for column in FACT_TEXT_COLS:
+        fact_df[column] = fact_df[column].astype(object).where(fact_df[column].notna(), None)
+    for column in FACT_DATE_COLS:
+        # Dates read from the database and dates built by pandas may come with different resolutions, which hash differently.
+        fact_df[column] = pd.to_datetime(fact_df[column]).astype("datetime64[ns]")
+    for column in FACT_NUMERIC_COLS:
+        fact_df[column] = pd.to_numeric(fact_df[column], errors="coerce").astype(float)
+
+    fact_columns = [column for column in FACT_COLS if column != "updated_at"]
+
+    return fact_df[fact_columns].sort_values(FACT_KEY_COLS).reset_index(drop=True)
+
+
+def search_fact_updates(fact_df: pd.DataFrame, existing_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Searches for the fact rows that are new or differ from the ones already in the database.
+
+    Args:
+        - fact_df: dataframe with the freshly built fact rows.
+        - existing_df: dataframe with the fact rows read from the database.
+
+    Returns:
+        diff_df: dataframe with the rows that will update the fact table.
+    """
+    value_cols = [column for column in fact_df.columns if column not in FACT_KEY_COLS]
+
+    # Nullable hashes keep rows missing from the database from turning the 64 bit hashes into floats.
+    fact_hashes = fact_df[FACT_KEY_COLS].assign(
+        row_hash=pd.array(pd.util.hash_pandas_object(fact_df[value_cols], index=False), dtype="UInt64"))
+    existing_hashes = existing_df[FACT_KEY_COLS].assign(
+        row_hash=pd.array(pd.util.hash_pandas_object(existing_df[value_cols], index=False), dtype="UInt64"))
+
+    compared_df = fact_hashes.merge(existing_hashes, on=FACT_KEY_COLS, how="left", suffixes=("", "_x"))
+    changed = ~(compared_df["row_hash"] == compared_df["row_hash_x"]).fillna(False).to_numpy(dtype=bool)
+
+    return fact_df[changed]
+
+
+def table_exists(conn, schema_name: str, table_name: str) -> bool:
+    """
+    Checks whether a table exists in the database.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - schema_name: name of the schema containing the table.
+        - table_name: name of the table.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass(%s);", (f"{schema_name}.{table_name}",))
+
+    return cursor.fetchone()[0] is not None
+
+
+def country_filter(column: str, country_codes, include_missing_codes=False) -> str:
+    """
+    Returns the WHERE clause restricting a query to some countries, or an empty string when every country is read. The ISO alpha-3 codes are passed as the 'country_codes' query parameter.
+
+    Args:
+        - column: name of the column holding the codes.
+        - country_codes: list of ISO alpha-3 codes, or None to read every country.
+        - include_missing_codes: whether the rows without a code, such as the ECDC aggregates, are read as well.
+    """
+    if country_codes is None:
+        return ""
+
+    condition = f"{column} = ANY(%(country_codes)s)"
+    if include_missing_codes:
+        condition = f"({condition} OR {column} IS NULL)"
+
+    return f" WHERE {condition}"
+
+
+def get_ecdc_data(conn, country_codes=None, include_missing_codes=False) -> pd.DataFrame:
+    """
+    Retrieves the rows of the ECDC table from the database.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: optional list of ISO alpha-3 codes of the countries to be read. Standard value is None, in which case every country is read.
+        - include_missing_codes: whether the aggregates without a code are read along with country_codes.
+    """
+    sql_query = (f'SELECT country, country_code, continent, population, "indicator", year_week, weekly_count, cumulative_count '
+                 f'FROM {COVID_SCHEMA_NAME}.{COVID_TABLE_NAME}{country_filter("country_code", country_codes, include_missing_codes)}')
+
+    return pd.read_sql(sql_query, conn, params={"country_codes": country_codes})
+
+
+def get_owid_data(conn, country_codes=None) -> pd.DataFrame:
+    """
+    Retrieves the daily OWID rows needed by the fact table from the database.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: optional list of ISO alpha-3 codes of the countries to be read. Standard value is None, in which case every country is read.
+    """
+    sql_query = (f'SELECT iso_code, date, {", ".join(VACCINATION_COLS)} '
+                 f'FROM {COVID_SCHEMA_NAME}.{VACCINATION_TABLE_NAME}{country_filter("iso_code", country_codes)}')
+
+    return pd.read_sql(sql_query, conn, params={"country_codes": country_codes})
+
+
+def get_weekly_fact(conn, country_codes=None, include_missing_codes=False) -> pd.DataFrame:
+    """
+    Retrieves the rows of the fact table from the database.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: optional list of ISO alpha-3 codes of the countries to be read. Standard value is None, in which case every country is read.
+        - include_missing_codes: whether the aggregates without a code are read along with country_codes.
+    """
+    fact_columns = ", ".join(column for column in FACT_COLS if column != "updated_at")
+    sql_query = (f'SELECT {fact_columns} '
+                 f'FROM {COVID_SCHEMA_NAME}.{WEEKLY_FACT_TABLE_NAME}{country_filter("country_code", country_codes, include_missing_codes)}')
+
+    return normalize_fact(pd.read_sql(sql_query, conn, params={"country_codes": country_codes}))
+
+
+def upsert_weekly_fact(conn, diff_df: pd.DataFrame) -> None:
+    """
+    Inserts and updates new and altered rows of the fact table.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - diff_df: dataframe with rows to be updated or inserted into the fact table.
+    """
+    update_columns = [column for column in FACT_COLS if column not in FACT_KEY_COLS]
+
+    sql = f"""
+    INSERT INTO {COVID_SCHEMA_NAME}.{WEEKLY_FACT_TABLE_NAME} ({", ".join(FACT_COLS)})
+    VALUES ({", ".join(["%s"] * len(FACT_COLS))})
+    ON CONFLICT (country, year_week) DO UPDATE
+    SET
+        {", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)}
+    """
+
+    diff_df = diff_df.assign(updated_at=datetime.now().date())[FACT_COLS]
+
+    cursor = conn.cursor()
+    chunk_rows = memory_budget.chunk_rows_for(diff_df) or max(len(diff_df), 1)
+
+    for chunk in memory_budget.iter_chunks(diff_df, chunk_rows):
+        # NaN would be stored as a NaN number, so missing values are sent as NULL.
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        cursor.executemany(sql, [tuple(row) for row in chunk.itertuples(index=False, name=None)])
+
+
+def refresh_weekly_fact(country_codes=None, include_missing_codes=False) -> int:
+    """
+    Builds the weekly fact table from the ECDC and OWID tables and upserts only the rows that changed. Called after either source is loaded, restricted to the countries it touched.
+
+    Args:
+        - country_codes: optional collection of ISO alpha-3 codes of the countries to be refreshed. Standard value is None, in which case every country is refreshed.
+        - include_missing_codes: whether the ECDC aggregates without a code, e.g. 'Africa (total)', are refreshed along with country_codes. Standard value is False.
+
+    Returns:
+        int: number of fact rows inserted or updated.
+    """
+    country_codes = sorted(country_codes) if country_codes is not None else None
+    if country_codes is not None and not country_codes and not include_missing_codes:
+        return 0
+
+    conn = connect_to_postgres(database=DATABASE_NAME)
+
+    try:
+        for table_name in [COVID_TABLE_NAME, VACCINATION_TABLE_NAME]:
+            if not table_exists(conn, COVID_SCHEMA_NAME, table_name):
+                print(f"Weekly fact refresh skipped: {COVID_SCHEMA_NAME}.{table_name} is not loaded")
+                return 0
+
+        cursor = conn.cursor()
+        cursor.execute(CREATE_FACT_TABLE_SQL)
+
+        upserted_rows = 0
+        for batch_codes, batch_missing_codes in plan_refresh_batches(conn, country_codes, include_missing_codes):
+            upserted_rows += refresh_batch(conn, batch_codes, batch_missing_codes)
+    finally:
+        conn.close()
+
+    print(f"{COVID_SCHEMA_NAME}.{WEEKLY_FACT_TABLE_NAME}: {upserted_rows} rows inserted or updated")
+
+    return upserted_rows
+
+
+def refresh_batch(conn, country_codes, include_missing_codes) -> int:
+    """
+    Builds the fact rows of some countries in memory and upserts the ones that changed.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: list of ISO alpha-3 codes of the countries to be refreshed, or None for every country.
+        - include_missing_codes: whether the ECDC aggregates without a code are refreshed along with country_codes.
+
+    Returns:
+        int: number of fact rows inserted or updated.
+    """
+    fact_df = build_weekly_fact(get_ecdc_data(conn, country_codes, include_missing_codes),
+                                get_owid_data(conn, country_codes))
+    diff_df = search_fact_updates(fact_df, get_weekly_fact(conn, country_codes, include_missing_codes))
+
+    upsert_weekly_fact(conn, diff_df)
+
+    return len(diff_df)
+
+
+def plan_refresh_batches(conn, country_codes, include_missing_codes) -> list:
+    """
+    Splits a refresh into batches of countries when reading all of them at once would go over the memory budget.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: list of ISO alpha-3 codes of the countries to be refreshed, or None for every country.
+        - include_missing_codes: whether the ECDC aggregates without a code are refreshed along with country_codes.
+
+    Returns:
+        list: (country_codes, include_missing_codes) tuples, a single one holding the arguments when no budget is set or the refresh fits in it.
+    """
+    if memory_budget.get_memory_budget_bytes() is None:
+        return [(country_codes, include_missing_codes)]
+
+    row_counts = count_rows_by_code(conn, country_codes, include_missing_codes)
+    if not memory_budget.exceeds_budget(sum(row_counts.values()) * FACT_REFRESH_ROW_BYTES):
+        return [(country_codes, include_missing_codes)]
+
+    return batch_country_codes(row_counts, memory_budget.rows_per_chunk(FACT_REFRESH_ROW_BYTES))
+
+
+def count_rows_by_code(conn, country_codes, include_missing_codes) -> dict:
+    """
+    Counts the ECDC and OWID rows a refresh reads for every country.
+
+    Args:
+        - conn: psycopg2.connection object to the database.
+        - country_codes: list of ISO alpha-3 codes of the countries to be refreshed, or None for every country.
+        - include_missing_codes: whether the ECDC aggregates without a code are counted along with country_codes.
+
+    Returns:
+        dict: number of rows by ISO alpha-3 code, under None for the ECDC aggregates without a code.
+    """
+    params = {"country_codes": country_codes}
+    cursor = conn.cursor()
+
+    cursor.execute(f'SELECT country_code, COUNT(*) FROM {COVID_SCHEMA_NAME}.{COVID_TABLE_NAME}'
+                   f'{country_filter("country_code", country_codes, include_missing_codes)} GROUP BY country_code', params)
+    row_counts = dict(cursor.fetchall())
+
+    cursor.execute(f'SELECT iso_code, COUNT(*) FROM {COVID_SCHEMA_NAME}.{VACCINATION_TABLE_NAME}'
+                   f'{country_filter("iso_code", country_codes)} GROUP BY iso_code', params)
+    for code, count in cursor.fetchall():
+        # OWID rows of codes missing from the ECDC data, such as the OWID aggregates, are never read by the refresh.
+        if code in row_counts:
+            row_counts[code] += count
+
+    return row_counts
+
+
+def batch_country_codes(row_counts: dict, rows_per_batch: int) -> list:
+    """
+    Groups countries into batches of up to rows_per_batch rows. A country with more rows than that gets a batch of its own, and the ECDC aggregates without a code are refreshed in a last batch of their own.
+
+    Args:
+        - row_counts: number of rows by ISO alpha-3 code, under None for the rows without a code.
+        - rows_per_batch: number of rows a batch may hold.
+
+    Returns:
+        list: (country_codes, include_missing_codes) tuples, one per batch.
+    """
+    batches = []
+    batch_codes, batch_rows = [], 0
+
+    for code in sorted(code for code in row_counts if code is not None):
+        if batch_codes and batch_rows + row_counts[code] > rows_per_batch:
+            batches.append((batch_codes, False))
+            batch_codes, batch_rows = [], 0
+        batch_codes.append(code)
+        batch_rows += row_counts[code]
+
+    if batch_codes:
+        batches.append((batch_codes, False))
+    if None in row_counts:
+        batches.append(([], True))
+
+    return batches
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from covid_etl import cli, config
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+HEAVY_MODULES = ["pandas", "numpy", "requests", "sqlalchemy"]
+
+REPORT_HEAVY_MODULES = f"print(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+
+
+def run_in_subprocess(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+    return result.stdout.strip().splitlines()
+
+
+def test_dry_run_does_not_import_pipeline_dependencies():
+    output = run_in_subprocess(
+        "import sys\n"
+        "from covid_etl.cli import main\n"
+        "main(['incremental', '--dry-run'])\n"
+        f"{REPORT_HEAVY_MODULES}\n"
+        "print('psycopg2' in sys.modules)\n")
+
+    assert output[0] == "incremental would:"
+    assert output[-2:] == ["[]", "False"]
+
+
+def test_status_only_imports_psycopg2():
+    # The connection is refused up front, so that the test does not depend on a running PostgreSQL.
+    output = run_in_subprocess(
+        "import sys\n"
+        "import psycopg2\n"
+        "from covid_etl import db\n"
+        "def refuse(database=None):\n"
+        "    raise psycopg2.OperationalError('refused')\n"
+        "db.connect_to_postgres = refuse\n"
+        "from covid_etl.cli import main\n"
+        "assert main(['status']) == 1\n"
+        f"{REPORT_HEAVY_MODULES}\n")
+
+    assert output[-1] == "[]"
+
+
+def run_with_fake_pipeline(monkeypatch, argv):
+    calls = []
+    fake_module = SimpleNamespace(main=lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(cli.importlib, "import_module", lambda name: fake_module)
+
+    assert cli.main(argv) == 0
+
+    return calls
+
+
+def test_upsert_workers_reaches_the_pipeline_only_when_set(monkeypatch):
+    assert run_with_fake_pipeline(monkeypatch, ["incremental"]) == [{}]
+    assert run_with_fake_pipeline(monkeypatch, ["incremental", "--upsert-workers", "3"]) == [{"upsert_workers": 3}]
+
+
+def test_dry_run_shows_the_ecdc_source_of_the_run(monkeypatch, capsys):
+    monkeypatch.delenv("COVID_ETL_MEMORY_BUDGET_MB", raising=False)
+
+    cli.main(["init-load", "--dry-run"])
+    assert f"extract {config.ECDC_URL}" in capsys.readouterr().out
+
+    cli.main(["incremental", "--dry-run", "--memory-budget-mb", "500"])
+    assert f"extract {config.ECDC_CSV_URL}" in capsys.readouterr().out
+
+    monkeypatch.setenv("COVID_ETL_MEMORY_BUDGET_MB", "500")
+    cli.main(["init-load", "--dry-run"])
+    assert f"extract {config.ECDC_CSV_URL}" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "two"])
+def test_upsert_workers_must_be_a_positive_int(monkeypatch, capsys, value):
+    with pytest.raises(SystemExit):
+        run_with_fake_pipeline(monkeypatch, ["incremental", "--upsert-workers", value])
+
+    assert "invalid positive int value" in capsys.readouterr().err
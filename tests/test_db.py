@@ -0,0 +1,53 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from covid_etl import memory_budget
+from covid_etl.db import create_sql_script
+from covid_etl.init_load import transform_phase
+
+COVID_TABLE_PARAMS = {"table_name": "national_14day_covid_data", "schema_name": "covid_data",
+                      "primary_key_cols": ["country", "year_week", "indicator"], "column_types": {"updated_at": "DATE"}}
+
+
+def sample_ecdc_df():
+    return pd.DataFrame({
+        "country": ["Chile", "Chile", "Peru", "Peru"],
+        "country_code": ["CHL", "CHL", "PER", "PER"],
+        "indicator": ["cases", "deaths", "cases", "deaths"],
+        "year_week": ["2021-30", "2021-30", "2021-30", "2021-30"],
+        "weekly_count": [5, 1, 8, np.nan],
+        "rate_14_day": [1.5, 0.1, 2.0, 0.0],
+    })
+
+
+def test_create_sql_script_declares_date_values_as_date():
+    df = pd.DataFrame({"country": ["Chile"], "updated_at": [date(2021, 8, 1)]})
+
+    sql_script = create_sql_script(df, table_name="t", schema_name="s")
+
+    assert "updated_at DATE NOT NULL" in sql_script
+    assert "country TEXT NOT NULL" in sql_script
+
+
+def test_create_sql_script_column_types_override_empty_frame():
+    df = pd.DataFrame({"updated_at": pd.Series(dtype=object)})
+
+    sql_script = create_sql_script(df, table_name="t", schema_name="s", column_types={"updated_at": "DATE"})
+
+    assert "updated_at DATE" in sql_script
+
+
+def test_init_load_paths_create_the_same_table():
+    transformed_df = transform_phase(sample_ecdc_df())
+    in_memory_script = create_sql_script(transformed_df, **COVID_TABLE_PARAMS)
+
+    with memory_budget.SpillStore("extracted") as store:
+        for chunk in memory_budget.iter_chunks(sample_ecdc_df(), 2):
+            store.write(transform_phase(chunk.copy()))
+        spilled_script = create_sql_script(store.schema_frame(), nullable_columns=store.nullable_columns,
+                                           **COVID_TABLE_PARAMS)
+
+    assert spilled_script == in_memory_script
+    assert "updated_at DATE NOT NULL" in spilled_script
@@ -0,0 +1,241 @@
+from decimal import Decimal
+
+import pandas as pd
+import psycopg2
+import pytest
+
+from covid_etl import incremental
+from covid_etl.incremental import (CONFLICT_KEY_COLS, UPSERT_COLS, get_upsert_workers, read_sql_chunks, release_connection,
+                                   shard_by_conflict_key, upsert_shard)
+
+
+def test_shard_by_conflict_key_shards_are_disjoint_and_complete():
+    diff_df = pd.DataFrame({
+        "country": [f"country {i % 7}" for i in range(200)],
+        "year_week": [f"2021-{i % 52 + 1:02d}" for i in range(200)],
+        "indicator": ["cases", "deaths"] * 100,
+        "weekly_count": range(200),
+    })
+    # Repeats some keys, which must land in the same shard.
+    diff_df = pd.concat([diff_df, diff_df.head(20)], ignore_index=True)
+
+    shards = shard_by_conflict_key(diff_df, 4)
+
+    assert sum(len(shard_df) for shard_df in shards) == len(diff_df)
+    shard_keys = [set(shard_df[CONFLICT_KEY_COLS].itertuples(index=False, name=None)) for shard_df in shards]
+    for i, keys in enumerate(shard_keys):
+        for other_keys in shard_keys[i + 1:]:
+            assert not keys & other_keys
+
+
+class FakeNamedCursor:
+    def __init__(self, rows, columns):
+        self.rows = list(rows)
+        self.columns = columns
+        self.description = None
+        self.fetch_sizes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql_query):
+        pass
+
+    def fetchmany(self, size):
+        # Like a named cursor, the description is only known once rows are fetched.
+        self.description = [(column,) for column in self.columns]
+        self.fetch_sizes.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.autocommit = True
+        self.closed = False
+        self.cursor_name = None
+        self._cursor = cursor
+
+    def cursor(self, name=None):
+        self.cursor_name = name
+        return self._cursor
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_sql_chunks_uses_a_server_side_cursor():
+    cursor = FakeNamedCursor([("Chile", Decimal("1.5")), ("Peru", None), ("Spain", Decimal("2"))], ["country", "rate_14_day"])
+    conn = FakeConnection(cursor)
+
+    chunks = list(read_sql_chunks("SELECT", conn, 2))
+
+    assert conn.cursor_name is not None
+    assert not conn.autocommit
+    assert conn.closed
+    assert cursor.fetch_sizes == [2, 2, 2]
+    assert [list(chunk["country"]) for chunk in chunks] == [["Chile", "Peru"], ["Spain"]]
+    assert chunks[0]["rate_14_day"].dtype == float
+
+
+def test_read_sql_chunks_yields_columns_of_an_empty_result():
+    conn = FakeConnection(FakeNamedCursor([], ["country", "rate_14_day"]))
+
+    chunks = list(read_sql_chunks("SELECT", conn, 2))
+
+    assert len(chunks) == 1
+    assert chunks[0].empty
+    assert list(chunks[0].columns) == ["country", "rate_14_day"]
+    assert conn.closed
+
+
+class FakeUpsertCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def executemany(self, sql, rows):
+        if self.conn.execute_errors:
+            raise self.conn.execute_errors.pop(0)
+        self.conn.executed.extend(rows)
+
+
+class FakeUpsertConnection:
+    def __init__(self, execute_errors=(), rollback_error=None, closed=0):
+        self.execute_errors = list(execute_errors)
+        self.rollback_error = rollback_error
+        self.closed = closed
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeUpsertCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.rollback_error:
+            raise self.rollback_error
+
+
+class FakePool:
+    def __init__(self, connections, getconn_errors=()):
+        self.connections = list(connections)
+        self.getconn_errors = list(getconn_errors)
+        self.returned = []
+
+    def getconn(self):
+        if self.getconn_errors:
+            raise self.getconn_errors.pop(0)
+        return self.connections.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(incremental.time, "sleep", delays.append)
+    return delays
+
+
+def sample_shard():
+    return pd.DataFrame([{column: f"{column} {i}" for column in UPSERT_COLS} for i in range(3)])
+
+
+def test_upsert_shard_retries_a_failed_checkout(sleeps):
+    conn = FakeUpsertConnection()
+    pool = FakePool([conn], getconn_errors=[psycopg2.OperationalError("pool exhausted")])
+
+    assert upsert_shard(pool, "sql", sample_shard()) == 3
+    assert len(conn.executed) == 3
+    assert conn.commits == 1
+    assert pool.returned == [(conn, False)]
+    assert len(sleeps) == 1
+
+
+def test_upsert_shard_retries_a_rolled_back_transaction(sleeps):
+    failed_conn = FakeUpsertConnection(execute_errors=[psycopg2.extensions.TransactionRollbackError("deadlock")])
+    conn = FakeUpsertConnection()
+    pool = FakePool([failed_conn, conn])
+
+    assert upsert_shard(pool, "sql", sample_shard()) == 3
+    assert failed_conn.commits == 0
+    assert failed_conn.rollbacks == 1
+    assert conn.commits == 1
+    assert pool.returned == [(failed_conn, False), (conn, False)]
+
+
+def test_upsert_shard_raises_on_the_last_attempt(sleeps):
+    connections = [FakeUpsertConnection(execute_errors=[psycopg2.OperationalError("connection dropped")])
+                   for _ in range(incremental.UPSERT_MAX_ATTEMPTS)]
+    pool = FakePool(connections)
+
+    with pytest.raises(psycopg2.OperationalError):
+        upsert_shard(pool, "sql", sample_shard())
+
+    assert [conn for conn, _ in pool.returned] == connections
+    assert len(sleeps) == incremental.UPSERT_MAX_ATTEMPTS - 1
+
+
+def test_upsert_shard_does_not_retry_other_errors(sleeps):
+    conn = FakeUpsertConnection(execute_errors=[psycopg2.DataError("invalid input")])
+    pool = FakePool([conn, FakeUpsertConnection()])
+
+    with pytest.raises(psycopg2.DataError):
+        upsert_shard(pool, "sql", sample_shard())
+
+    assert pool.returned == [(conn, False)]
+    assert sleeps == []
+
+
+def test_release_connection_discards_a_closed_connection():
+    conn = FakeUpsertConnection(closed=2)
+    pool = FakePool([])
+
+    release_connection(pool, conn)
+
+    assert conn.rollbacks == 0
+    assert pool.returned == [(conn, True)]
+
+
+def test_release_connection_discards_a_connection_failing_to_roll_back():
+    conn = FakeUpsertConnection(rollback_error=psycopg2.InterfaceError("connection already closed"))
+    pool = FakePool([])
+
+    release_connection(pool, conn)
+
+    assert pool.returned == [(conn, True)]
+
+
+def test_get_upsert_workers(monkeypatch):
+    monkeypatch.delenv("COVID_ETL_UPSERT_WORKERS", raising=False)
+    assert get_upsert_workers() == 1
+    assert get_upsert_workers(4) == 4
+
+    monkeypatch.setenv("COVID_ETL_UPSERT_WORKERS", "3")
+    assert get_upsert_workers() == 3
+    assert get_upsert_workers(2) == 2
+
+
+@pytest.mark.parametrize("upsert_workers, env_value", [(0, None), (-2, None), (None, "0"), (None, "four")])
+def test_get_upsert_workers_rejects_non_positive_values(monkeypatch, upsert_workers, env_value):
+    if env_value is None:
+        monkeypatch.delenv("COVID_ETL_UPSERT_WORKERS", raising=False)
+    else:
+        monkeypatch.setenv("COVID_ETL_UPSERT_WORKERS", env_value)
+
+    with pytest.raises(ValueError):
+        get_upsert_workers(upsert_workers)
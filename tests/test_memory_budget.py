@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covid_etl import memory_budget
+
+
+def test_spill_store_keyed_partitions_are_colocated():
+    left_df = pd.DataFrame({"country": list("ABCDEFGH") * 3, "value": range(24)})
+    right_df = pd.DataFrame({"country": list("HGFEDCBA"), "other": range(8)})
+
+    with memory_budget.SpillStore("left", n_partitions=4) as left_store, \
+            memory_budget.SpillStore("right", n_partitions=4) as right_store:
+        for chunk in memory_budget.iter_chunks(left_df, 5):
+            left_store.write(chunk, key_cols=["country"])
+        right_store.write(right_df, key_cols=["country"])
+
+        for partition in left_store.partitions():
+            left_countries = set(left_store.read(partition)["country"])
+            assert left_countries == set(right_store.read(partition)["country"])
+
+        assert sum(len(frame) for frame in left_store) == len(left_df)
+
+
+def test_spill_store_unkeyed_frames_keep_write_order():
+    with memory_budget.SpillStore("ordered") as store:
+        store.write(pd.DataFrame({"value": [1, 2]}))
+        store.write(pd.DataFrame({"value": [3]}))
+
+        assert [list(frame["value"]) for frame in store] == [[1, 2], [3]]
+
+
+def test_spill_store_missing_partition_is_empty_with_columns():
+    with memory_budget.SpillStore("empty", n_partitions=4) as store:
+        store.write(pd.DataFrame({"country": [], "value": []}))
+
+        assert list(store.read(3).columns) == ["country", "value"]
+        assert store.partitions() == []
+
+
+def test_spill_store_collects_schema_across_chunks():
+    with memory_budget.SpillStore("schema") as store:
+        store.write(pd.DataFrame({"count": [1, 2], "note": ["a", "b"]}))
+        store.write(pd.DataFrame({"count": [1.5, np.nan], "note": ["c", "d"]}))
+
+        assert store.schema_frame()["count"].dtype == np.dtype("float64")
+        assert store.nullable_columns == {"count"}
+
+
+def test_spill_store_removes_files_when_block_raises():
+    with pytest.raises(RuntimeError):
+        with memory_budget.SpillStore("failing") as store:
+            store.write(pd.DataFrame({"value": [1]}))
+            directory = store.directory
+            raise RuntimeError
+
+    assert not os.path.exists(directory)
+
+
+def test_chunk_rows_for_without_budget(monkeypatch):
+    monkeypatch.setattr(memory_budget, "MEMORY_BUDGET_MB", None)
+
+    assert memory_budget.chunk_rows_for(pd.DataFrame({"value": range(10)})) is None
+
+
+def test_chunk_rows_for_over_budget(monkeypatch):
+    # A budget below the RSS of the interpreter is always exceeded.
+    monkeypatch.setattr(memory_budget, "MEMORY_BUDGET_MB", 1)
+
+    chunk_rows = memory_budget.chunk_rows_for(pd.DataFrame({"value": range(10)}))
+
+    assert chunk_rows is not None
+    assert chunk_rows >= memory_budget.MIN_CHUNK_ROWS
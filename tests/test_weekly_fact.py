@@ -0,0 +1,227 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covid_etl import memory_budget, weekly_fact
+from covid_etl.weekly_fact import (align_vaccinations_to_weeks, batch_country_codes, build_weekly_fact, country_filter,
+                                   iso_week_end_dates, normalize_fact, pivot_ecdc_weekly, plan_refresh_batches,
+                                   search_fact_updates)
+
+
+def ecdc_rows(country, country_code, year_week, cases, deaths):
+    return [
+        {"country": country, "country_code": country_code, "continent": "America", "population": 1000,
+         "indicator": "cases", "year_week": year_week, "weekly_count": cases, "cumulative_count": cases * 10},
+        {"country": country, "country_code": country_code, "continent": "America", "population": 1000,
+         "indicator": "deaths", "year_week": year_week, "weekly_count": deaths, "cumulative_count": deaths * 10},
+    ]
+
+
+@pytest.mark.parametrize("year_week, week_end", [
+    ("2020-31", "2020-08-02"),
+    # 2020 has 53 ISO weeks; the last one ends in January 2021.
+    ("2020-53", "2021-01-03"),
+    ("2021-01", "2021-01-10"),
+    # Week 1 of 2019 starts on Monday 31/12/2018.
+    ("2019-01", "2019-01-06"),
+    ("2015-53", "2016-01-03"),
+    ("2020-W05", "2020-02-02"),
+])
+def test_iso_week_end_dates(year_week, week_end):
+    result = iso_week_end_dates(pd.Series([year_week]))
+
+    assert result.iloc[0] == pd.Timestamp(week_end)
+    assert result.iloc[0].dayofweek == 6
+
+
+def test_iso_week_end_dates_unparseable_label():
+    result = iso_week_end_dates(pd.Series(["2020-31", "not a week"]))
+
+    assert result.iloc[0] == pd.Timestamp("2020-08-02")
+    assert pd.isna(result.iloc[1])
+
+
+def test_pivot_ecdc_weekly_puts_cases_and_deaths_side_by_side():
+    ecdc_df = pd.DataFrame(ecdc_rows("Chile", "CHL", "2020-31", 5, 1) + ecdc_rows("Chile", "CHL", "2020-32", 7, 2))
+
+    weekly_df = pivot_ecdc_weekly(ecdc_df).sort_values("year_week").reset_index(drop=True)
+
+    assert list(weekly_df["year_week"]) == ["2020-31", "2020-32"]
+    assert list(weekly_df["weekly_cases"]) == [5, 7]
+    assert list(weekly_df["cumulative_deaths"]) == [10, 20]
+    assert list(weekly_df["week_end_date"]) == [pd.Timestamp("2020-08-02"), pd.Timestamp("2020-08-09")]
+
+
+def test_align_vaccinations_to_weeks_is_backward_and_fills_gaps():
+    weekly_df = pd.DataFrame({
+        "country": "United States Of America",
+        "country_code": "USA",
+        "year_week": ["2020-51", "2020-52", "2020-53", "2021-01"],
+        "week_end_date": pd.to_datetime(["2020-12-20", "2020-12-27", "2021-01-03", "2021-01-10"]),
+    })
+    owid_df = pd.DataFrame({
+        "iso_code": "USA",
+        "date": ["2020-12-21", "2020-12-27", "2021-01-04"],
+        "people_vaccinated_per_hundred": [1.0, np.nan, 3.0],
+        "people_fully_vaccinated_per_hundred": [0.5, np.nan, np.nan],
+        "gdp_per_capita": [54225.0, 54225.0, 54225.0],
+    })
+
+    aligned_df = align_vaccinations_to_weeks(weekly_df, owid_df).set_index("year_week")
+
+    # No OWID row on or before the end of the first week.
+    assert pd.isna(aligned_df.loc["2020-51", "people_vaccinated_per_hundred"])
+    # The row of the last day of the week carries forward the value reported before the gap.
+    assert aligned_df.loc["2020-52", "people_vaccinated_per_hundred"] == 1.0
+    assert aligned_df.loc["2020-53", "people_vaccinated_per_hundred"] == 1.0
+    # Rows after the end of the week are not used.
+    assert aligned_df.loc["2021-01", "people_vaccinated_per_hundred"] == 3.0
+    assert aligned_df.loc["2021-01", "people_fully_vaccinated_per_hundred"] == 0.5
+    assert aligned_df.loc["2021-01", "gdp_per_capita"] == 54225.0
+
+
+def test_align_vaccinations_to_weeks_matches_codes_not_names():
+    weekly_df = pd.DataFrame({
+        "country": ["Democratic Republic of the Congo", "EU/EEA (total)"],
+        "country_code": ["COD", None],
+        "year_week": ["2021-30", "2021-30"],
+        "week_end_date": pd.to_datetime(["2021-08-01", "2021-08-01"]),
+    })
+    owid_df = pd.DataFrame({
+        "iso_code": ["COD", "OWID_EUR"],
+        "date": ["2021-07-30", "2021-07-30"],
+        "people_vaccinated_per_hundred": [0.1, 50.0],
+        "people_fully_vaccinated_per_hundred": [0.05, 40.0],
+        "gdp_per_capita": [808.1, np.nan],
+    })
+
+    aligned_df = align_vaccinations_to_weeks(weekly_df, owid_df).set_index("country")
+
+    assert aligned_df.loc["Democratic Republic of the Congo", "people_vaccinated_per_hundred"] == 0.1
+    # Rows without a code are kept, without vaccination data.
+    assert pd.isna(aligned_df.loc["EU/EEA (total)", "people_vaccinated_per_hundred"])
+
+
+def build_sample_fact():
+    ecdc_df = pd.DataFrame(ecdc_rows("Chile", "CHL", "2021-30", 5, 1) + ecdc_rows("Peru", "PER", "2021-30", 8, np.nan))
+    owid_df = pd.DataFrame({
+        "iso_code": ["CHL", "PER"],
+        "date": ["2021-07-28", "2021-07-29"],
+        "people_vaccinated_per_hundred": [70.2, np.nan],
+        "people_fully_vaccinated_per_hundred": [60.1, 20.3],
+        "gdp_per_capita": [22767.0, 12236.7],
+    })
+
+    return build_weekly_fact(ecdc_df, owid_df)
+
+
+def read_back_from_database(fact_df):
+    """
+    Mimics the types pd.read_sql returns for the fact table: dates as datetime.date, BIGINT as int, NULL as None.
+    """
+    rows = fact_df.astype(object).where(fact_df.notna(), None)
+    rows["week_end_date"] = [value.date() for value in fact_df["week_end_date"]]
+    rows["population"] = [int(value) for value in fact_df["population"]]
+
+    return normalize_fact(pd.DataFrame(rows.to_dict("records")))
+
+
+def test_search_fact_updates_finds_nothing_for_rows_read_back():
+    fact_df = build_sample_fact()
+
+    diff_df = search_fact_updates(fact_df, read_back_from_database(fact_df))
+
+    assert diff_df.empty
+
+
+def test_search_fact_updates_finds_changed_and_new_rows():
+    fact_df = build_sample_fact()
+    existing_df = read_back_from_database(fact_df)
+    existing_df.loc[existing_df["country"] == "Chile", "weekly_cases"] = 4.0
+    existing_df = existing_df[existing_df["country"] != "Peru"]
+
+    diff_df = search_fact_updates(fact_df, existing_df)
+
+    assert sorted(diff_df["country"]) == ["Chile", "Peru"]
+
+
+def test_search_fact_updates_with_empty_table():
+    fact_df = build_sample_fact()
+    existing_df = normalize_fact(pd.DataFrame(columns=fact_df.columns))
+
+    assert len(search_fact_updates(fact_df, existing_df)) == len(fact_df)
+
+
+def test_build_weekly_fact_columns():
+    fact_df = build_sample_fact()
+
+    assert fact_df.loc[fact_df["country"] == "Chile", "week_end_date"].iloc[0] == pd.Timestamp(date(2021, 8, 1))
+    assert fact_df.loc[fact_df["country"] == "Peru", "people_fully_vaccinated_per_hundred"].iloc[0] == 20.3
+
+
+def test_align_vaccinations_to_weeks_without_owid_rows():
+    # An empty result of pd.read_sql only has object columns.
+    weekly_df = pivot_ecdc_weekly(pd.DataFrame(ecdc_rows("Kosovo", "XKX", "2021-30", 5, 1)))
+    owid_df = pd.DataFrame({column: pd.Series(dtype=object)
+                            for column in ["iso_code", "date", "people_vaccinated_per_hundred",
+                                           "people_fully_vaccinated_per_hundred", "gdp_per_capita"]})
+
+    aligned_df = align_vaccinations_to_weeks(weekly_df, owid_df)
+
+    assert list(aligned_df["country"]) == ["Kosovo"]
+    assert aligned_df[["people_vaccinated_per_hundred", "gdp_per_capita"]].isna().all().all()
+    assert len(build_weekly_fact(pd.DataFrame(ecdc_rows("Kosovo", "XKX", "2021-30", 5, 1)), owid_df)) == 1
+
+
+def test_align_vaccinations_to_weeks_with_date_objects():
+    # Dates read from the database come as datetime.date objects on both sides.
+    weekly_df = pd.DataFrame({
+        "country": ["Chile"],
+        "country_code": pd.Series(["CHL"], dtype="str"),
+        "year_week": ["2021-30"],
+        "week_end_date": [date(2021, 8, 1)],
+    })
+    owid_df = pd.DataFrame({
+        "iso_code": pd.Series(["CHL", "CHL"], dtype=object),
+        "date": [date(2021, 7, 30), date(2021, 8, 2)],
+        "people_vaccinated_per_hundred": [70.2, 71.0],
+        "people_fully_vaccinated_per_hundred": [60.1, 61.0],
+        "gdp_per_capita": [22767.0, 22767.0],
+    })
+
+    aligned_df = align_vaccinations_to_weeks(weekly_df, owid_df)
+
+    assert aligned_df["people_vaccinated_per_hundred"].iloc[0] == 70.2
+
+
+def test_country_filter():
+    assert country_filter("country_code", None) == ""
+    assert country_filter("country_code", None, include_missing_codes=True) == ""
+    assert country_filter("iso_code", ["CHL"]) == " WHERE iso_code = ANY(%(country_codes)s)"
+    assert (country_filter("country_code", [], include_missing_codes=True)
+            == " WHERE (country_code = ANY(%(country_codes)s) OR country_code IS NULL)")
+
+
+def test_batch_country_codes():
+    row_counts = {"PER": 40, "CHL": 30, "USA": 150, "ARG": 50, None: 20}
+
+    batches = batch_country_codes(row_counts, 100)
+
+    assert batches == [(["ARG", "CHL"], False), (["PER"], False), (["USA"], False), ([], True)]
+
+
+def test_plan_refresh_batches_without_budget(monkeypatch):
+    monkeypatch.setattr(memory_budget, "MEMORY_BUDGET_MB", None)
+
+    assert plan_refresh_batches(None, ["CHL"], True) == [(["CHL"], True)]
+
+
+def test_plan_refresh_batches_over_budget(monkeypatch):
+    # A budget below the RSS of the interpreter is always exceeded.
+    monkeypatch.setattr(memory_budget, "MEMORY_BUDGET_MB", 1)
+    monkeypatch.setattr(weekly_fact, "count_rows_by_code", lambda conn, country_codes, include_missing_codes: {
+        "CHL": memory_budget.MIN_CHUNK_ROWS, "PER": memory_budget.MIN_CHUNK_ROWS, None: 10})
+
+    assert plan_refresh_batches(None, None, False) == [(["CHL"], False), (["PER"], False), ([], True)]